@@ -0,0 +1,85 @@
+"""
+Load time and generation throughput of the LLM serving paths.
+
+    python bench_serving.py --threads 8 --new-tokens 128
+
+Variants (each skipped if it cannot run on this machine):
+  gpu-4bit        the original path: bitsandbytes NF4 + unmerged LoRA
+  cpu-unmerged    fp32 base + unmerged LoRA on CPU (the original path minus bnb)
+  cpu-merged      merged fp32 weights
+  cpu-merged-int8 merged weights + dynamic int8 Linear layers
+"""
+import gc
+import time
+import argparse
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+import llm_loader
+from main import INSTRUCTION
+
+PROMPT = (
+    f"### Instruction:\n{INSTRUCTION}\n### Input:\n"
+    "Complaint: Garbage has not been collected in Zone 3 for two weeks and the smell is unbearable.\n"
+    "Impact Scope: Medium population\n### Response:\n"
+)
+
+
+def load_cpu_unmerged():
+    base = AutoModelForCausalLM.from_pretrained(llm_loader.BASE_MODEL_ID, torch_dtype=torch.float32)
+    return llm_loader.attach_adapter(base), AutoTokenizer.from_pretrained(llm_loader.BASE_MODEL_ID)
+
+
+VARIANTS = {
+    "gpu-4bit": (llm_loader.load_gpu_4bit, "cuda"),
+    "cpu-unmerged": (load_cpu_unmerged, "cpu"),
+    "cpu-merged": (lambda: llm_loader.load_cpu(quantization="none"), "cpu"),
+    "cpu-merged-int8": (lambda: llm_loader.load_cpu(quantization="int8"), "cpu"),
+}
+
+
+def tokens_per_sec(model, tokenizer, device: str, new_tokens: int, runs: int) -> float:
+    inputs = tokenizer(PROMPT, return_tensors="pt").to(device)
+    generated, elapsed = 0, 0.0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            out = model.generate(
+                **inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False
+            )
+        elapsed += time.perf_counter() - t0
+        generated += out.shape[1] - inputs["input_ids"].shape[1]
+    return generated / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--new-tokens", type=int, default=128)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--variants", nargs="+", default=list(VARIANTS))
+    args = ap.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print(f"torch threads={torch.get_num_threads()}")
+
+    print(f"{'variant':16} {'load s':>8} {'tokens/s':>9}")
+    for name in args.variants:
+        loader, device = VARIANTS[name]
+        if device == "cuda" and not torch.cuda.is_available():
+            print(f"{name:16} skipped (no CUDA)")
+            continue
+        t0 = time.perf_counter()
+        model, tokenizer = loader()
+        load_s = time.perf_counter() - t0
+        model.eval()
+        tps = tokens_per_sec(model, tokenizer, device, args.new_tokens, args.runs)
+        print(f"{name:16} {load_s:8.1f} {tps:9.2f}")
+        del model
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
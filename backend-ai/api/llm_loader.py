@@ -0,0 +1,110 @@
+import os
+import time
+import logging
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from peft import PeftModel
+
+logger = logging.getLogger(__name__)
+
+BASE_MODEL_ID = "TinyLlama/TinyLlama-1.1B-intermediate-step-1431k-3T"
+ADAPTER_PATH = "../llm/tinyllama-finetuned"
+# Written by ../llm/merge_adapter.py
+MERGED_MODEL_PATH = os.getenv("MERGED_MODEL_PATH", "../llm/tinyllama-merged")
+
+# "auto" picks gpu-4bit when CUDA is available, cpu otherwise
+SERVING_MODE = os.getenv("SERVING_MODE", "auto")
+# "int8" (torch.ao dynamic quantization of Linear layers) or "none"
+CPU_QUANTIZATION = os.getenv("CPU_QUANTIZATION", "int8")
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))          # 0 = torch default
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+
+def resolve_mode(mode: str = SERVING_MODE) -> str:
+    if mode == "auto":
+        return "gpu-4bit" if torch.cuda.is_available() else "cpu"
+    return mode
+
+
+def configure_threads(threads: int = TORCH_THREADS, interop_threads: int = TORCH_INTEROP_THREADS):
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        # Only allowed before the first parallel op; ignore if too late
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set interop threads: {e}")
+
+
+def attach_adapter(base_model):
+    if os.path.exists(ADAPTER_PATH):
+        model = PeftModel.from_pretrained(base_model, ADAPTER_PATH)
+        logger.info("Fine-tuned adapter attached.")
+        return model
+    logger.warning(f"Adapter not found at {ADAPTER_PATH}. Using base model.")
+    return base_model
+
+
+def load_gpu_4bit():
+    """The original path: 4-bit NF4 base model with the LoRA adapter unmerged"""
+    logger.info("Loading TinyLlama (4-bit)...")
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_quant_type="nf4"
+    )
+
+    base_model = AutoModelForCausalLM.from_pretrained(
+        BASE_MODEL_ID,
+        quantization_config=bnb_config,
+        device_map="auto"
+    )
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_ID)
+    return attach_adapter(base_model), tokenizer
+
+
+def load_cpu(quantization: str = CPU_QUANTIZATION):
+    """
+    Merged fp32 weights (no per-forward LoRA overhead), optionally with
+    dynamic int8 quantization of every Linear layer.
+    """
+    configure_threads()
+
+    if os.path.exists(MERGED_MODEL_PATH):
+        logger.info(f"Loading merged TinyLlama from {MERGED_MODEL_PATH}...")
+        model = AutoModelForCausalLM.from_pretrained(MERGED_MODEL_PATH, torch_dtype=torch.float32)
+        tokenizer = AutoTokenizer.from_pretrained(MERGED_MODEL_PATH)
+    else:
+        logger.warning(
+            f"No merged model at {MERGED_MODEL_PATH}; merging the adapter at startup. "
+            "Run llm/merge_adapter.py once to skip this."
+        )
+        base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_ID, torch_dtype=torch.float32)
+        model = attach_adapter(base_model)
+        if isinstance(model, PeftModel):
+            model = model.merge_and_unload()
+        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_ID)
+
+    model.eval()
+    if quantization == "int8":
+        logger.info("Applying dynamic int8 quantization to Linear layers...")
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model, tokenizer
+
+
+def load_llm(mode: str = SERVING_MODE):
+    mode = resolve_mode(mode)
+    t0 = time.perf_counter()
+    if mode == "gpu-4bit":
+        model, tokenizer = load_gpu_4bit()
+    elif mode == "cpu":
+        model, tokenizer = load_cpu()
+    else:
+        raise ValueError(f"Unknown SERVING_MODE: {mode}")
+    model.eval()
+    logger.info(f"LLM ready in {time.perf_counter() - t0:.1f}s (mode={mode}).")
+    return model, tokenizer
@@ -0,0 +1,114 @@
+"""
+Load test for /chat at several concurrency levels.
+
+    python load_test.py --url http://localhost:8001 --levels 1 2 4 8 16 --requests 32
+
+Reports throughput, latency percentiles and the scheduler's batch stats
+after each level.
+
+Every request sends a query no earlier request (in this or an earlier
+run) used, so the query embedding cache never hits. The semantic answer cache matches by meaning,
+not text, so the run refuses to start while it is enabled: start the
+server with SEMANTIC_CACHE_ITEMS=0 (or pass --allow-semantic-cache).
+Cache hits per level are printed so a cached run is visible.
+"""
+import json
+import time
+import random
+import argparse
+import itertools
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ISSUES = [
+    "Garbage has not been collected", "The water pipeline has burst",
+    "Street lights are not working", "Sewage is overflowing",
+    "Large potholes are causing accidents", "Stray dogs are attacking children",
+    "The drainage is blocked", "Illegal dumping of construction waste continues",
+]
+PLACES = [f"in Zone {z}" for z in range(1, 10)] + [
+    "near the market", "on MG Road", "near the primary school", "on the highway",
+    "behind the bus depot", "near the railway station",
+]
+DURATIONS = ["since yesterday", "for two weeks", "for a month", "every monsoon", "for three days"]
+
+
+RUN_ID = f"{random.randrange(16 ** 6):06x}"
+
+
+def distinct_queries(n: int, start: int, seed: int = 0) -> list:
+    """n different queries; start offsets them so each level gets its own"""
+    combos = list(itertools.product(ISSUES, PLACES, DURATIONS))
+    random.Random(seed).shuffle(combos)
+    out = []
+    for i in range(start, start + n):
+        issue, place, duration = combos[i % len(combos)]
+        # The reference keeps the text unique across runs and past the combinations
+        out.append(f"{issue} {place} {duration} (ref {RUN_ID}-{i})")
+    return out
+
+
+def post_chat(url: str, query: str) -> float:
+    body = json.dumps({"query": query}).encode("utf-8")
+    req = urllib.request.Request(
+        f"{url}/chat", data=body, headers={"Content-Type": "application/json"}
+    )
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        resp.read()
+    return time.perf_counter() - t0
+
+
+def get_json(url: str):
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def cache_hits(url: str) -> dict:
+    """Hits so far per cache name, from /cache/stats"""
+    caches = get_json(f"{url}/cache/stats")["caches"]
+    return {c["name"]: c["hits"] + c.get("disk_hits", 0) for c in caches}
+
+
+def run_level(url: str, concurrency: int, queries: list):
+    n_requests = len(queries)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(lambda q: post_chat(url, q), queries))
+    elapsed = time.perf_counter() - t0
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    return n_requests / elapsed, pct(0.5), pct(0.99)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8001")
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--requests", type=int, default=32)
+    ap.add_argument("--allow-semantic-cache", action="store_true",
+                    help="run even if the server's semantic answer cache is on")
+    args = ap.parse_args()
+
+    semantic = "semantic_answers" in cache_hits(args.url)
+    print(f"semantic answer cache: {'on' if semantic else 'off (SEMANTIC_CACHE_ITEMS=0)'}")
+    if semantic and not args.allow_semantic_cache:
+        raise SystemExit(
+            "The semantic answer cache would serve most requests; restart the "
+            "server with SEMANTIC_CACHE_ITEMS=0 or pass --allow-semantic-cache"
+        )
+
+    print(f"{'conc':>5} {'req/s':>8} {'p50 s':>8} {'p99 s':>8} {'avg batch':>10} {'cache hits':>11}")
+    sent = 0
+    for level in args.levels:
+        queries = distinct_queries(args.requests, start=sent)
+        sent += len(queries)
+        before = cache_hits(args.url)
+        rps, p50, p99 = run_level(args.url, level, queries)
+        after = cache_hits(args.url)
+        hits = sum(after[name] - before.get(name, 0) for name in after)
+        stats = get_json(f"{args.url}/scheduler/stats")
+        print(f"{level:5d} {rps:8.3f} {p50:8.2f} {p99:8.2f} {stats['avg_batch_size']:10} {hits:11d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,182 @@
 import os
+import sys
 import torch
 import faiss
-import pickle
 import json
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from peft import PeftModel
+from collections import namedtuple
+from transformers import StoppingCriteriaList, TextIteratorStreamer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import threading
+
+from llm_loader import SERVING_MODE, load_llm, resolve_mode
+from scheduler import GenerationScheduler
+from prefix_cache import PrefixCache
+from semantic_cache import SemanticCache
+from stopping import CancelStop, JsonAnswerStop, extract_json_answer
+
+# Helpers shared with the risk service (backend/)
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend")
+sys.path.append(BACKEND_DIR)
+from cache import ContentCache, content_key
+from embeddings import load_embedder
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rag")
+sys.path.append(RAG_DIR)
+from doc_store import has_doc_store, load_docs
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-BASE_MODEL_ID = "TinyLlama/TinyLlama-1.1B-intermediate-step-1431k-3T"
-ADAPTER_PATH = "../llm/tinyllama-finetuned"
 VECTOR_STORE_DIR = "../rag/vector_store"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+GEN_MAX_BATCH_SIZE = int(os.getenv("GEN_MAX_BATCH_SIZE", "8"))
+GEN_MAX_WAIT_MS = float(os.getenv("GEN_MAX_WAIT_MS", "25"))
+GEN_MAX_STREAMS = int(os.getenv("GEN_MAX_STREAMS", "4"))  # /chat/stream requests running or waiting
+QUERY_CACHE_ITEMS = int(os.getenv("QUERY_CACHE_ITEMS", "10000"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB")  # optional SQLite file, survives restarts
+SEMANTIC_CACHE_ITEMS = int(os.getenv("SEMANTIC_CACHE_ITEMS", "2000"))  # 0 disables the answer cache
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+PREFIX_CACHE_ENTRIES = int(os.getenv("PREFIX_CACHE_ENTRIES", "16"))  # 0 disables the KV prefix cache
+PREFIX_CACHE_MIN_USES = int(os.getenv("PREFIX_CACHE_MIN_USES", "2"))
+DEVICE = "cuda" if resolve_mode(SERVING_MODE) == "gpu-4bit" else "cpu"
 
 resources = {}
 
+def apply_search_params(index):
+    """Runtime overrides for the ANN search knobs stored in the index"""
+    params = faiss.ParameterSpace()
+    for env, name in (("INDEX_NPROBE", "nprobe"), ("INDEX_HNSW_EF_SEARCH", "efSearch")):
+        value = os.getenv(env)
+        if not value:
+            continue
+        try:
+            params.set_index_parameter(index, name, int(value))
+            logger.info(f"Vector index {name} set to {value}.")
+        except RuntimeError:
+            logger.warning(f"{env} ignored: index has no {name} parameter.")
+
+def live_store_dir() -> str:
+    """Current generation written by vector_create.py, or the legacy flat layout"""
+    pointer = os.path.join(VECTOR_STORE_DIR, "CURRENT")
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            return os.path.join(VECTOR_STORE_DIR, f.read().strip())
+    return VECTOR_STORE_DIR
+
+def read_index_mmap(index_path: str):
+    """Map the index file instead of copying it into each worker's heap"""
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        # Not every index type / faiss build can be mapped
+        logger.warning(f"mmap load not supported ({e}); reading index into memory.")
+        return faiss.read_index(index_path)
+
+# One published generation. Swapped in with a single assignment, so a
+# search never pairs one generation's index with another's documents.
+VectorStore = namedtuple("VectorStore", "index docs search_slack store_dir")
+vector_store_reload = threading.Lock()
+
+def load_vector_store() -> bool:
+    store_dir = live_store_dir()
+    index_path = os.path.join(store_dir, "index.faiss")
+    docs_ready = has_doc_store(store_dir) or os.path.exists(os.path.join(store_dir, "docs.pkl"))
+
+    if not (os.path.exists(index_path) and docs_ready):
+        return False
+
+    if not has_doc_store(store_dir):
+        logger.warning("Loading legacy docs.pkl; run rag/doc_store.py to migrate it.")
+
+    index = read_index_mmap(index_path)
+    apply_search_params(index)
+    docs = load_docs(store_dir)
+
+    # HNSW generations keep deleted vectors (docs[id] is None); over-fetch a little
+    tombstones = 0
+    manifest_path = os.path.join(store_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            tombstones = len(json.load(f).get("tombstones", []))
+
+    resources["vector_store"] = VectorStore(index, docs, min(tombstones, 16), store_dir)
+    return True
+
+def reload_vector_store_if_changed():
+    """Pick up a generation published by an incremental update"""
+    store = resources.get("vector_store")
+    if store is None or store.store_dir == live_store_dir():
+        return
+    # One request reloads; the others keep searching the current generation
+    if not vector_store_reload.acquire(blocking=False):
+        return
+    try:
+        if resources["vector_store"].store_dir == live_store_dir():
+            return
+        load_vector_store()
+        logger.info(f"Vector DB reloaded from {resources['vector_store'].store_dir}.")
+        # Cached answers refer to passage ids of the previous generation
+        if resources.get("semantic_cache") is not None:
+            resources["semantic_cache"].clear()
+    except Exception as e:
+        logger.error(f"Failed to reload Vector DB: {e}")
+    finally:
+        vector_store_reload.release()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Server starting up...")
 
     # Load Vector Database
     try:
-        index_path = os.path.join(VECTOR_STORE_DIR, "index.faiss")
-        docs_path = os.path.join(VECTOR_STORE_DIR, "docs.pkl")
-        
-        if os.path.exists(index_path) and os.path.exists(docs_path):
-            resources["index"] = faiss.read_index(index_path)
-            with open(docs_path, "rb") as f:
-                resources["docs"] = pickle.load(f)
-            resources["embedder"] = SentenceTransformer("all-MiniLM-L6-v2")
+        if load_vector_store():
+            resources["embedder"] = load_embedder()
+            resources["query_cache"] = ContentCache(
+                "query_embeddings", max_items=QUERY_CACHE_ITEMS,
+                ttl=QUERY_CACHE_TTL, disk_path=QUERY_CACHE_DB,
+            )
+            if SEMANTIC_CACHE_ITEMS > 0:
+                resources["semantic_cache"] = SemanticCache(
+                    resources["embedder"].get_sentence_embedding_dimension(),
+                    threshold=SEMANTIC_CACHE_THRESHOLD,
+                    max_items=SEMANTIC_CACHE_ITEMS, ttl=SEMANTIC_CACHE_TTL,
+                )
             logger.info("Vector DB loaded successfully.")
         else:
             logger.warning("Vector DB files not found. RAG functionality disabled.")
-            resources["index"] = None
+            resources["vector_store"] = None
     except Exception as e:
         logger.error(f"Failed to load Vector DB: {e}")
 
     # Load Model & Tokenizer
     try:
-        logger.info("Loading TinyLlama (4-bit)...")
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_quant_type="nf4"
-        )
-        
-        base_model = AutoModelForCausalLM.from_pretrained(
-            BASE_MODEL_ID, 
-            quantization_config=bnb_config, 
-            device_map="auto"
-        )
-        
-        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_ID)
-
-        if os.path.exists(ADAPTER_PATH):
-            model = PeftModel.from_pretrained(base_model, ADAPTER_PATH)
-            logger.info("Fine-tuned adapter attached.")
-        else:
-            logger.warning(f"Adapter not found at {ADAPTER_PATH}. Using base model.")
-            model = base_model
-            
-        model.eval()
+        model, tokenizer = load_llm(SERVING_MODE)
         resources["model"] = model
         resources["tokenizer"] = tokenizer
+
+        if PREFIX_CACHE_ENTRIES > 0:
+            resources["prefix_cache"] = PrefixCache(
+                model, tokenizer, DEVICE, header=PROMPT_HEADER,
+                max_entries=PREFIX_CACHE_ENTRIES, min_uses=PREFIX_CACHE_MIN_USES,
+            )
+
+        resources["scheduler"] = GenerationScheduler(
+            model, tokenizer, DEVICE,
+            max_batch_size=GEN_MAX_BATCH_SIZE,
+            max_wait_ms=GEN_MAX_WAIT_MS,
+            generate_kwargs=GENERATE_KWARGS,
+            stopping_criteria=lambda n: json_stop(tokenizer, n),
+            prefix_cache=resources.get("prefix_cache"),
+        )
+        await resources["scheduler"].start()
         
     except Exception as e:
         logger.error(f"Critical error loading LLM: {e}")
@@ -78,6 +185,8 @@ async def lifespan(app: FastAPI):
     yield
 
     logger.info("Server shutting down.")
+    if resources.get("scheduler") is not None:
+        await resources["scheduler"].stop()
     resources.clear()
 
 app = FastAPI(title="CivicMind API", version="1.0", lifespan=lifespan)
@@ -96,71 +205,245 @@ class QueryRequest(BaseModel):
 
 @app.get("/health")
 def health_check():
-    return {"status": "active", "device": DEVICE}
+    return {"status": "active", "device": DEVICE, "serving_mode": resolve_mode(SERVING_MODE)}
 
-@app.post("/chat")
-def generate_response(request: QueryRequest):
-    if resources.get("model") is None:
-        raise HTTPException(status_code=503, detail="Model not loaded.")
+@app.get("/cache/stats")
+def cache_stats():
+    caches = [resources.get("query_cache"), resources.get("semantic_cache")]
+    prefix_cache = resources.get("prefix_cache")
+    return {
+        "caches": [c.stats() for c in caches if c is not None],
+        "prefix_cache": prefix_cache.stats() if prefix_cache is not None else None,
+    }
 
-    try:
-        # RAG Retrieval
-        retrieved_context = ""
-        context_list = []
-        
-        if resources.get("index") is not None:
-            query_emb = resources["embedder"].encode([request.query], convert_to_numpy=True)
-            _, indices = resources["index"].search(query_emb, request.top_k)
-            
-            seen = set()
-            for idx in indices[0]:
-                if idx != -1 and idx < len(resources["docs"]):
-                    text = resources["docs"][idx].strip()
-                    if text not in seen:
-                        context_list.append(text)
-                        seen.add(text)
-            
-            retrieved_context = "\n".join(context_list)
-
-        # Prompt Formatting
-        instruction = "Analyze the civic complaint and determine severity, responsible department, explanation, and resolution steps."
-        input_text = retrieved_context if retrieved_context else request.query
-        
-        prompt = f"### Instruction:\n{instruction}\n### Input:\n{input_text}\n### Response:\n"
+def embed_query(query: str):
+    """Query embedding, reused for repeated queries"""
+    cache = resources["query_cache"]
+    # The loaded embedder's version: torch if the ONNX export was missing
+    key = content_key(query, resources["embedder"].version)
+    query_emb = cache.get(key)
+    if query_emb is None:
+        query_emb = resources["embedder"].encode([query], convert_to_numpy=True)
+        cache.set(key, query_emb)
+    return query_emb
 
-        # Inference
-        inputs = resources["tokenizer"](prompt, return_tensors="pt").to(DEVICE)
-        
-        with torch.no_grad():
-            outputs = resources["model"].generate(
-                **inputs,
-                max_new_tokens=512,
-                temperature=0.1,
-                do_sample=True,
-                repetition_penalty=1.1
-            )
-        
-        full_response = resources["tokenizer"].decode(outputs[0], skip_special_tokens=True)
-        answer_text = full_response.split("### Response:")[-1].strip()
+INSTRUCTION = "Analyze the civic complaint and determine severity, responsible department, explanation, and resolution steps."
+# Constant start of every prompt; its KV cache is computed once (see prefix_cache.py)
+PROMPT_HEADER = f"### Instruction:\n{INSTRUCTION}\n### Input:\n"
 
-        # JSON Parsing
-        try:
-            parsed_json = json.loads(answer_text)
+GENERATE_KWARGS = dict(
+    max_new_tokens=512,
+    temperature=0.1,
+    do_sample=True,
+    repetition_penalty=1.1
+)
+
+def retrieve_context(query: str, top_k: int) -> tuple:
+    """
+    RAG retrieval: distinct passages among the top_k nearest documents,
+    and the ids of those documents
+    """
+    context_list = []
+    context_ids = []
+
+    reload_vector_store_if_changed()
+
+    store = resources.get("vector_store")
+    if store is not None:
+        query_emb = embed_query(query)
+        docs = store.docs
+        _, indices = store.index.search(query_emb, top_k + store.search_slack)
+
+        seen = set()
+        for idx in indices[0]:
+            doc = docs[idx] if idx != -1 and idx < len(docs) else None
+            if doc is not None:
+                if len(context_ids) == top_k:
+                    break
+                context_ids.append(int(idx))
+                text = doc.strip()
+                if text not in seen:
+                    context_list.append(text)
+                    seen.add(text)
+
+    return context_list, tuple(sorted(context_ids))
+
+def build_prompt(query: str, context_list: list) -> str:
+    retrieved_context = "\n".join(context_list)
+    input_text = retrieved_context if retrieved_context else query
+    return f"{PROMPT_HEADER}{input_text}\n### Response:\n"
+
+def prompt_key(prompt: str) -> str:
+    return content_key(prompt)
+
+def json_stop(tokenizer, prompt_length: int) -> StoppingCriteriaList:
+    """Stop once the answer JSON (severity, department, ...) is complete"""
+    return StoppingCriteriaList([JsonAnswerStop(tokenizer, prompt_length)])
+
+def parse_answer(full_response: str, context_list: list) -> dict:
+    answer_text = full_response.split("### Response:")[-1].strip()
+
+    # JSON Parsing
+    try:
+        parsed_json = json.loads(answer_text)
+        return {
+            "answer": parsed_json,
+            "retrieved_context": context_list
+        }
+    except json.JSONDecodeError:
+        # Early stopping can leave a few characters after the closing brace
+        parsed_json = extract_json_answer(answer_text, required_keys=())
+        if parsed_json is not None:
             return {
                 "answer": parsed_json,
                 "retrieved_context": context_list
             }
-        except json.JSONDecodeError:
-            return {
-                "answer": answer_text,
-                "retrieved_context": context_list,
-                "note": "Raw text returned (JSON parsing failed)"
-            }
+        return {
+            "answer": answer_text,
+            "retrieved_context": context_list,
+            "note": "Raw text returned (JSON parsing failed)"
+        }
+
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    scheduler = resources.get("scheduler")
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+    return scheduler.stats()
+
+@app.post("/chat")
+async def generate_response(request: QueryRequest):
+    if resources.get("model") is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+
+    try:
+        context_list, context_ids = await run_in_threadpool(retrieve_context, request.query, request.top_k)
+
+        # Near-identical query over the same passages: reuse its answer
+        semantic_cache = resources.get("semantic_cache")
+        if semantic_cache is not None:
+            query_emb = await run_in_threadpool(embed_query, request.query)
+            cached = semantic_cache.lookup(query_emb, context_ids)
+            if cached is not None:
+                return cached
+
+        prompt = build_prompt(request.query, context_list)
+
+        # Inference (batched with other in-flight requests)
+        full_response = await resources["scheduler"].submit(prompt, cache_key=prompt_key(prompt))
+        result = parse_answer(full_response, context_list)
+
+        # Raw-text fallbacks are not worth repeating
+        if semantic_cache is not None and "note" not in result:
+            semantic_cache.insert(query_emb, context_ids, result)
+        return result
 
     except Exception as e:
         logger.error(f"Error during generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+stream_slots = threading.BoundedSemaphore(GEN_MAX_STREAMS)
+DISCONNECT_POLL_S = 0.5
+
+def release_stream_slot(generation: asyncio.Future):
+    # Held until generate() has really finished, not just the response
+    stream_slots.release()
+    if not generation.cancelled() and generation.exception() is not None:
+        logger.error(f"Streaming generation failed: {generation.exception()}")
+
+@app.post("/chat/stream")
+async def generate_response_stream(request: QueryRequest, http_request: Request):
+    """
+    Server-sent events version of /chat: a "context" event with the
+    retrieved passages, one "token" event per decoded chunk as it is
+    generated, then a "done" event with the parsed answer. Generation
+    stops as soon as the JSON answer is complete, or when the client
+    disconnects.
+
+    Streams run on the scheduler's generate thread, one at a time between
+    batches; at most GEN_MAX_STREAMS may be running or waiting (beyond
+    that the stream is a single "error" event).
+    """
+    if resources.get("model") is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+
+    model, tokenizer = resources["model"], resources["tokenizer"]
+    context_list, _ = await run_in_threadpool(retrieve_context, request.query, request.top_k)
+    prompt = build_prompt(request.query, context_list)
+    inputs = tokenizer(prompt, return_tensors="pt").to(DEVICE)
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=300)
+    cancelled = threading.Event()
+
+    def run_generate():
+        try:
+            if cancelled.is_set():  # client left while waiting for its turn
+                return
+            prefix_cache = resources.get("prefix_cache")
+            past = prefix_cache.past_for(inputs["input_ids"], prompt_key(prompt)) if prefix_cache else None
+            stopping = json_stop(tokenizer, inputs["input_ids"].shape[1])
+            stopping.append(CancelStop(cancelled))
+            with torch.no_grad():
+                model.generate(
+                    **inputs,
+                    past_key_values=past,
+                    streamer=streamer,
+                    stopping_criteria=stopping,
+                    **GENERATE_KWARGS,
+                )
+        except BaseException:
+            streamer.end()  # unblock the reader
+            raise
+        finally:
+            if cancelled.is_set():
+                streamer.end()
+
+    async def watch_disconnect():
+        while not cancelled.is_set():
+            if await http_request.is_disconnected():
+                cancelled.set()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_S)
+
+    async def events():
+        # Taken here, not in the handler: if the response fails or the client
+        # leaves before the body is iterated, this never runs and no slot leaks
+        if not stream_slots.acquire(blocking=False):
+            yield sse("error", {"detail": "Too many streaming requests, retry shortly."})
+            return
+        watcher = asyncio.create_task(watch_disconnect())
+        generation = asyncio.ensure_future(resources["scheduler"].run_exclusive(run_generate))
+        try:
+            yield sse("context", context_list)
+
+            pieces = []
+            tokens = iter(streamer)
+            while True:
+                piece = await run_in_threadpool(next, tokens, None)
+                if piece is None or cancelled.is_set():
+                    break
+                if piece:
+                    pieces.append(piece)
+                    yield sse("token", piece)
+
+            if not cancelled.is_set():
+                await generation  # surfaces generate() errors
+                result = parse_answer("### Response:" + "".join(pieces), context_list)
+                yield sse("done", result)
+        except Exception as e:
+            logger.error(f"Error during streaming generation: {e}")
+            yield sse("error", {"detail": str(e)})
+        finally:
+            # Also reached when the response is closed early (client gone)
+            cancelled.set()
+            watcher.cancel()
+            generation.add_done_callback(release_stream_slot)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,130 @@
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixCache:
+    """
+    Reuses past_key_values for prompt prefixes the model has already seen.
+
+    Two levels:
+      * the constant instruction header, computed once at startup
+      * an LRU of whole-prompt prefixes keyed by a hash of the prompt (fixed
+        by the retrieved passages), admitted once a key has been seen
+        `min_uses` times so one-off contexts do not evict hot ones
+
+    Only single-sequence generation can use it: left padding in a batch
+    shifts every prompt to a different offset.
+    """
+
+    def __init__(self, model, tokenizer, device: str, header: str, max_entries: int = 16, min_uses: int = 2):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_entries = max_entries
+        self.min_uses = min_uses
+        self._entries = OrderedDict()
+        self._uses = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.header_ids = tokenizer(header, return_tensors="pt").input_ids.to(device)
+        self.header_kv = self._prefill(self.header_ids)
+
+        self.hits = {"context": 0, "header": 0, "none": 0}
+        self.prefill_tokens_saved = 0
+
+    def _prefill(self, input_ids, past_key_values=None):
+        with torch.no_grad():
+            out = self.model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+        return out.past_key_values
+
+    @staticmethod
+    def _starts_with(ids, prefix_ids) -> bool:
+        # Tokenizing the prompt as a whole can merge tokens across the
+        # boundary, so a cached prefix is only valid if the ids really match
+        n = prefix_ids.shape[1]
+        return ids.shape[1] > n and torch.equal(ids[:, :n], prefix_ids)
+
+    def _count_use(self, key) -> int:
+        self._uses[key] = self._uses.get(key, 0) + 1
+        self._uses.move_to_end(key)
+        while len(self._uses) > self.max_entries * 16:
+            self._uses.popitem(last=False)
+        return self._uses[key]
+
+    def past_for(self, input_ids, key=None):
+        """
+        past_key_values (a private copy) covering as much of input_ids as is
+        cached, or None. The last prompt token is never cached, so
+        generate() always has one token left to prefill.
+        """
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and self._starts_with(input_ids, entry[0]):
+                self._entries.move_to_end(key)
+                self.hits["context"] += 1
+                self.prefill_tokens_saved += entry[0].shape[1]
+                return copy.deepcopy(entry[1])
+            admit = key is not None and self._count_use(key) >= self.min_uses
+
+        if not self._starts_with(input_ids, self.header_ids):
+            self.hits["none"] += 1
+            return None
+
+        self.hits["header"] += 1
+        self.prefill_tokens_saved += self.header_ids.shape[1]
+        past = copy.deepcopy(self.header_kv)
+        if not admit:
+            return past
+
+        # Extend the header cache to everything but the last prompt token and keep it
+        prefix_ids = input_ids[:, :-1]
+        past = self._prefill(prefix_ids[:, self.header_ids.shape[1]:], past_key_values=past)
+        with self._lock:
+            self._entries[key] = (prefix_ids, copy.deepcopy(past))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return past
+
+    def generate(self, prompt: str, key=None, stopping_criteria=None, **generate_kwargs):
+        """
+        Single-prompt generate() that starts from the cached prefix.
+        stopping_criteria is a callable(prompt_length), as in the scheduler.
+        """
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
+        if stopping_criteria is not None:
+            generate_kwargs["stopping_criteria"] = stopping_criteria(inputs["input_ids"].shape[1])
+        past = self.past_for(inputs["input_ids"], key)
+        with torch.no_grad():
+            return self.model.generate(
+                **inputs,
+                past_key_values=past,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_kwargs,
+            )
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "header_tokens": self.header_ids.shape[1],
+            "hits": dict(self.hits),
+            "prefill_tokens_saved": self.prefill_tokens_saved,
+        }
+
+
+def time_prefill(model, tokenizer, device: str, prompt: str, past=None) -> float:
+    """Seconds for the prefill plus one decode step (max_new_tokens=1)"""
+    inputs = tokenizer(prompt, return_tensors="pt").to(device)
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        model.generate(**inputs, past_key_values=past, max_new_tokens=1, do_sample=False,
+                       pad_token_id=tokenizer.pad_token_id)
+    return time.perf_counter() - t0
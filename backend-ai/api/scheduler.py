@@ -0,0 +1,164 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationScheduler:
+    """
+    Dynamic batching for model.generate.
+
+    Requests are queued; the batching loop takes the first waiting prompt,
+    keeps collecting until `max_batch_size` prompts are queued or
+    `max_wait_ms` has passed, then runs one left-padded generate() for the
+    whole batch on a dedicated thread and hands each decoded output back to
+    its caller.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        generate_kwargs: dict = None,
+        stopping_criteria=None,
+        prefix_cache=None,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.generate_kwargs = generate_kwargs or {}
+        # Optional callable(prompt_length) -> StoppingCriteriaList, built per batch
+        self.stopping_criteria = stopping_criteria
+        # Optional PrefixCache, used when a batch holds a single prompt
+        self.prefix_cache = prefix_cache
+
+        # Decoder-only models must be padded on the left for batched generation
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self._queue = None
+        self._task = None
+        # One thread: generate() calls never overlap, batches do the sharing
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generate")
+
+        self.batches = 0
+        self.requests = 0
+        self._latencies = deque(maxlen=200)
+        self._sizes = deque(maxlen=200)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, prompt: str, cache_key=None) -> str:
+        """
+        Queue a prompt and wait for its decoded output (prompt included).
+        cache_key identifies the prompt prefix for the prefix cache.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, cache_key, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Drop callers that went away while queued
+            batch = [(p, k, f) for p, k, f in batch if not f.done()]
+            if not batch:
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self._generate, [(p, k) for p, k, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batched generation failed: {e}")
+                for _, _, f in batch:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+
+            self._latencies.append(time.perf_counter() - t0)
+            self._sizes.append(len(batch))
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, _, f), text in zip(batch, outputs):
+                if not f.done():
+                    f.set_result(text)
+
+    async def run_exclusive(self, fn):
+        """
+        Run fn() on the generate thread, between batches: used by /chat/stream
+        so streamed generations never run alongside batched ones.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    def _generate(self, items: List[tuple]) -> List[str]:
+        if len(items) == 1 and self.prefix_cache is not None:
+            prompt, key = items[0]
+            outputs = self.prefix_cache.generate(
+                prompt, key, stopping_criteria=self.stopping_criteria, **self.generate_kwargs
+            )
+            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        prompts = [p for p, _ in items]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+        kwargs = dict(self.generate_kwargs)
+        if self.stopping_criteria is not None:
+            kwargs["stopping_criteria"] = self.stopping_criteria(inputs["input_ids"].shape[1])
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **kwargs,
+            )
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "requests": self.requests,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_batch_size": round(sum(self._sizes) / len(self._sizes), 2) if self._sizes else 0,
+            "batch_latency_p50_s": round(lat[len(lat) // 2], 3) if lat else None,
+            "batch_latency_max_s": round(lat[-1], 3) if lat else None,
+        }
@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Parsed /chat answers for recent queries, looked up by embedding similarity.
+
+    A new query reuses a cached answer when its cosine similarity to a cached
+    query is at least `threshold` AND retrieval returned the same passages,
+    so a near-identical wording never borrows an answer built on other
+    context. Vectors live in a small exact inner-product index (normalized,
+    so inner product = cosine). Size is bounded LRU-style, entries expire
+    after `ttl` seconds.
+    """
+
+    def __init__(self, dim: int, threshold: float = 0.95, max_items: int = 2000,
+                 ttl: float = 3600.0, candidates: int = 8):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl = ttl
+        self.candidates = candidates
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._entries = OrderedDict()   # id -> (context_ids, answer, created)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.context_mismatches = self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vec)
+        return vec
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remove(self, ids):
+        for i in ids:
+            self._entries.pop(i, None)
+        self._index.remove_ids(np.array(ids, dtype=np.int64))
+
+    def lookup(self, embedding, context_ids: tuple):
+        """Cached answer for a similar query with the same context, or None"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            scores, ids = self._index.search(vec, min(self.candidates, len(self._entries)))
+            expired = []
+            answer = None
+            similar = False
+            for score, i in zip(scores[0], ids[0]):
+                if i == -1 or score < self.threshold:
+                    break
+                i = int(i)
+                cached_context, cached_answer, created = self._entries[i]
+                if self._expired(created):
+                    expired.append(i)
+                    continue
+                similar = True
+                if cached_context == context_ids:
+                    self._entries.move_to_end(i)
+                    answer = cached_answer
+                    break
+
+            if expired:
+                self._remove(expired)
+            if answer is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if similar:
+                    self.context_mismatches += 1
+            return answer
+
+    def insert(self, embedding, context_ids: tuple, answer: dict):
+        vec = self._normalize(embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (context_ids, answer, time.time())
+
+            overflow = len(self._entries) - self.max_items
+            if overflow > 0:
+                oldest = [i for i, _ in zip(self._entries, range(overflow))]
+                self._remove(oldest)
+                self.evictions += overflow
+
+    def clear(self):
+        """Drop everything, e.g. when the vector store (and so context ids) changes"""
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": "semantic_answers",
+            "size": len(self._entries),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "context_mismatches": self.context_mismatches,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
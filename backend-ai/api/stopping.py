@@ -0,0 +1,88 @@
+import json
+from typing import Optional
+
+import torch
+from transformers import StoppingCriteria
+
+# Keys the fine-tuned adapter emits (see data/data_llm_prep.py)
+ANSWER_KEYS = ("severity", "department", "explanation", "resolution")
+
+
+def balanced_json_end(text: str) -> int:
+    """
+    Index just past the first balanced top-level {...} in text, or -1.
+    Braces inside JSON strings are ignored.
+    """
+    start = text.find("{")
+    if start == -1:
+        return -1
+
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def extract_json_answer(text: str, required_keys=ANSWER_KEYS) -> Optional[dict]:
+    """First complete JSON object in text that has all required keys"""
+    end = balanced_json_end(text)
+    if end == -1:
+        return None
+    try:
+        obj = json.loads(text[text.find("{"):end])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(obj, dict) or not all(k in obj for k in required_keys):
+        return None
+    return obj
+
+
+class JsonAnswerStop(StoppingCriteria):
+    """
+    Ends generation for each sequence as soon as its new tokens contain a
+    complete JSON answer, instead of running on to max_new_tokens.
+    Works per row, so batched generate() stops rows independently.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, required_keys=ANSWER_KEYS):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.required_keys = required_keys
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        done = []
+        for row in input_ids:
+            # Only a token that closes a brace can complete the object
+            last = self.tokenizer.decode(row[-1:], skip_special_tokens=True)
+            if "}" not in last:
+                done.append(False)
+                continue
+            text = self.tokenizer.decode(row[self.prompt_length:], skip_special_tokens=True)
+            done.append(extract_json_answer(text, self.required_keys) is not None)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class CancelStop(StoppingCriteria):
+    """Ends generation once `event` is set, e.g. when the client disconnected"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,38 @@
+"""
+Merge the fine-tuned LoRA adapter into the TinyLlama base weights.
+
+    python merge_adapter.py                # -> ./tinyllama-merged
+
+The merged checkpoint is what the API loads with SERVING_MODE=cpu, so
+CPU nodes skip bitsandbytes and the per-forward LoRA matmuls.
+"""
+import argparse
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from peft import PeftModel
+
+BASE_MODEL_ID = "TinyLlama/TinyLlama-1.1B-intermediate-step-1431k-3T"
+ADAPTER_PATH = "./tinyllama-finetuned"
+MERGED_PATH = "./tinyllama-merged"
+
+
+def merge_adapter(adapter_path: str = ADAPTER_PATH, output_path: str = MERGED_PATH):
+    print(f"Loading {BASE_MODEL_ID} (fp32)...")
+    base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_ID, torch_dtype=torch.float32)
+
+    print(f"Merging adapter from {adapter_path}...")
+    model = PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+
+    print(f"Saving merged model to {output_path}...")
+    model.save_pretrained(output_path, safe_serialization=True)
+    AutoTokenizer.from_pretrained(BASE_MODEL_ID).save_pretrained(output_path)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--adapter", default=ADAPTER_PATH)
+    parser.add_argument("--output", default=MERGED_PATH)
+    args = parser.parse_args()
+    merge_adapter(args.adapter, args.output)
@@ -0,0 +1,91 @@
+"""
+Recall vs latency of ANN index settings against the exact flat index.
+
+    python bench_index.py --queries 1000 --k 5
+    python bench_index.py --embeddings embeddings.npy   # reuse saved embeddings
+
+A held-out sample of the corpus is used as queries. Recall@k is measured
+against IndexFlatL2; latency is per single-query search (as /chat does).
+"""
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from vector_create import DATASET_PATH, build_index, embed_documents, load_documents, load_embedder
+
+CONFIGS = [
+    ("flat", {}),
+    ("ivf_flat", {"nprobe": 4}),
+    ("ivf_flat", {"nprobe": 16}),
+    ("ivf_flat", {"nprobe": 64}),
+    ("ivf_pq", {"nprobe": 16}),
+    ("ivf_pq", {"nprobe": 64}),
+    ("hnsw", {"ef_search": 32}),
+    ("hnsw", {"ef_search": 64}),
+    ("hnsw", {"ef_search": 128}),
+]
+
+
+def load_embeddings(path: str) -> np.ndarray:
+    if path and os.path.exists(path):
+        return np.load(path)
+    embeddings = embed_documents(load_embedder(), load_documents(DATASET_PATH))
+    if path:
+        np.save(path, embeddings)
+    return embeddings
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    found, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        lat.append(time.perf_counter() - t0)
+        found.append(ids[0])
+    lat_ms = np.array(lat) * 1000
+    return np.array(found), np.percentile(lat_ms, 50), np.percentile(lat_ms, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--embeddings", default="", help="cache embeddings in this .npy file")
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    embeddings = load_embeddings(args.embeddings).astype(np.float32)
+
+    rng = np.random.default_rng(0)
+    held_out = rng.choice(len(embeddings), size=min(args.queries, len(embeddings) // 10), replace=False)
+    mask = np.ones(len(embeddings), dtype=bool)
+    mask[held_out] = False
+    corpus, queries = embeddings[mask], embeddings[held_out]
+    print(f"corpus={len(corpus)} queries={len(queries)} k={args.k} threads={args.threads}")
+
+    truth = None
+    print(f"{'index':10} {'params':18} {'build s':>8} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for index_type, params in CONFIGS:
+        t0 = time.perf_counter()
+        index = build_index(corpus, index_type=index_type, **params)
+        build_s = time.perf_counter() - t0
+
+        found, p50, p99 = time_queries(index, queries, args.k)
+        if truth is None:
+            truth = found  # first config is the exact flat index
+        desc = ",".join(f"{k}={v}" for k, v in params.items()) or "-"
+        print(f"{index_type:10} {desc:18} {build_s:8.1f} {recall_at_k(truth, found):7.3f} {p50:7.2f} {p99:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Startup time and resident memory of the vector store load paths.
+
+    python bench_startup.py vector_store
+
+Each variant runs in a fresh interpreter so RSS is not shared between
+them: pickle vs doc store for the passages, and read_index with and
+without IO_FLAG_MMAP for the FAISS index. Run after doc_store.py has
+migrated the store (docs.pkl is needed for the pickle variant).
+"""
+import os
+import sys
+import json
+import subprocess
+
+VARIANTS = {
+    "docs.pkl": "import pickle; docs = pickle.load(open(os.path.join(d, 'docs.pkl'), 'rb')); n = len(docs)",
+    "doc store": "from doc_store import DocStore; docs = DocStore(d); n = len(docs); docs[0]",
+    "index (read)": "import faiss; idx = faiss.read_index(os.path.join(d, 'index.faiss')); n = idx.ntotal",
+    "index (mmap)": (
+        "import faiss; idx = faiss.read_index(os.path.join(d, 'index.faiss'), "
+        "faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY); n = idx.ntotal"
+    ),
+}
+
+CHILD = """
+import os, sys, time, json
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+d = sys.argv[1]
+import numpy  # baseline includes numpy, which every variant needs
+before = rss_mb()
+t0 = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb() - before, "items": n}}))
+"""
+
+
+def live_dir(store_dir: str) -> str:
+    pointer = os.path.join(store_dir, "CURRENT")
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            return os.path.join(store_dir, f.read().strip())
+    return store_dir
+
+
+def main():
+    d = live_dir(sys.argv[1] if len(sys.argv) > 1 else "./vector_store")
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'variant':14} {'load s':>8} {'+RSS MB':>9} {'items':>9}")
+    for name, code in VARIANTS.items():
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD.format(code=code), d],
+            capture_output=True, text=True, cwd=here,
+        )
+        if proc.returncode != 0:
+            print(f"{name:14} failed: {proc.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(proc.stdout)
+        print(f"{name:14} {r['seconds']:8.3f} {r['rss_mb']:9.1f} {r['items']:9d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Memory-mapped document store for the RAG passages.
+
+Layout (next to index.faiss):
+    docs.bin          UTF-8 passages, concatenated
+    docs.offsets.npy  int64[N + 1]; passage i is docs.bin[offsets[i]:offsets[i+1]]
+
+Deleted passages have zero length. Both files are opened with mmap, so
+uvicorn workers share the page cache instead of each unpickling a
+Python list, and /chat only touches the pages of the passages it returns.
+
+Migrate an existing pickle:
+    python doc_store.py vector_store            # live generation or legacy dir
+    python doc_store.py vector_store/gen-000003
+"""
+import os
+import sys
+import mmap
+import pickle
+from typing import List, Optional
+
+import numpy as np
+
+BLOB_NAME = "docs.bin"
+OFFSETS_NAME = "docs.offsets.npy"
+
+
+def write_doc_store(docs: List[Optional[str]], directory: str):
+    offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    with open(os.path.join(directory, BLOB_NAME), "wb") as blob:
+        pos = 0
+        for i, text in enumerate(docs):
+            if text is not None:
+                data = text.encode("utf-8")
+                blob.write(data)
+                pos += len(data)
+            offsets[i + 1] = pos
+    np.save(os.path.join(directory, OFFSETS_NAME), offsets)
+
+
+def has_doc_store(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, OFFSETS_NAME))
+
+
+class DocStore:
+    """Read-only, list-like view over docs.bin; deleted entries read as None"""
+
+    def __init__(self, directory: str):
+        self.offsets = np.load(os.path.join(directory, OFFSETS_NAME), mmap_mode="r")
+        self._file = open(os.path.join(directory, BLOB_NAME), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        if start == end:
+            return None
+        return self._blob[start:end].decode("utf-8")
+
+    def to_list(self) -> List[Optional[str]]:
+        return [self[i] for i in range(len(self))]
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+def load_docs(directory: str):
+    """DocStore if present, else the legacy docs.pkl list"""
+    if has_doc_store(directory):
+        return DocStore(directory)
+    with open(os.path.join(directory, "docs.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def migrate(directory: str):
+    pointer = os.path.join(directory, "CURRENT")
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            directory = os.path.join(directory, f.read().strip())
+
+    with open(os.path.join(directory, "docs.pkl"), "rb") as f:
+        docs = pickle.load(f)
+    write_doc_store(docs, directory)
+
+    store = DocStore(directory)
+    assert len(store) == len(docs) and all(store[i] == d for i, d in enumerate(docs)), \
+        "doc store does not round-trip"
+    store.close()
+    print(f"Migrated {len(docs)} documents in {directory} (docs.pkl can now be removed).")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "./vector_store")
@@ -1,38 +1,223 @@
 import json
+import math
+import shutil
+import hashlib
+import argparse
 import faiss
-import pickle
 import numpy as np
 import os
-from sentence_transformers import SentenceTransformer
+import sys
 
+from doc_store import load_docs, write_doc_store
 
-DATASET_PATH = "../data/processed/llm_instructions.jsonl" 
+# Embedding backend shared with the risk service (backend/embeddings.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from embeddings import load_embedder
+
+
+DATASET_PATH = "../data/processed/llm_instructions.jsonl"
 DB_OUTPUT_DIR = "./vector_store"
-MODEL_NAME = "all-MiniLM-L6-v2"          
+MODEL_NAME = "all-MiniLM-L6-v2"
 
-def create_vector_db():
-    if not os.path.exists(DB_OUTPUT_DIR):
-        os.makedirs(DB_OUTPUT_DIR)
+# ---------------- INDEX SETTINGS ----------------
+# flat     : exact IndexFlatL2 (the original behaviour)
+# ivf_flat : inverted lists, full vectors      -> good recall, ~nlist/nprobe faster
+# ivf_pq   : inverted lists, product-quantized -> smallest memory footprint
+# hnsw     : graph index, no training needed    -> lowest latency at high recall
+INDEX_TYPE = os.getenv("INDEX_TYPE", "ivf_flat")
+NLIST = int(os.getenv("INDEX_NLIST", "0"))          # 0 = 4 * sqrt(N)
+NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+PQ_M = int(os.getenv("INDEX_PQ_M", "16"))            # sub-quantizers, must divide the dim
+PQ_NBITS = int(os.getenv("INDEX_PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("INDEX_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("INDEX_HNSW_EF_SEARCH", "64"))
+TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "100000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+ADD_BATCH_SIZE = 50000
 
-    print(f"Loading embedding model: {MODEL_NAME}...")
-    embedder = SentenceTransformer(MODEL_NAME)
 
-    print(f"Reading {DATASET_PATH}...")
+def load_documents(path: str = DATASET_PATH) -> list:
+    """
+    Texts to index from a JSONL file: the "input" of instruction records,
+    or the "complaint" of records exported by the risk service.
+    """
     documents = []
-    
-
-    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         for line in f:
             try:
                 data = json.loads(line)
                 text_to_index = data.get("input", "").strip()
-              
-                if len(text_to_index) > 10: 
+                if not text_to_index and data.get("complaint"):
+                    text_to_index = f"Complaint: {data['complaint'].strip()}"
+
+                if len(text_to_index) > 10:
                     documents.append(text_to_index)
             except json.JSONDecodeError:
                 continue
+    return documents
+
+
+def default_nlist(n: int) -> int:
+    # Rule of thumb: ~4*sqrt(N) lists, while keeping >= 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def training_sample(embeddings: np.ndarray, n_train: int, seed: int = 123) -> np.ndarray:
+    if len(embeddings) <= n_train:
+        return embeddings
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(embeddings), size=n_train, replace=False))
+    return embeddings[rows]
+
+
+def build_index(
+    embeddings: np.ndarray,
+    ids: np.ndarray = None,
+    index_type: str = INDEX_TYPE,
+    nlist: int = NLIST,
+    nprobe: int = NPROBE,
+    pq_m: int = PQ_M,
+    pq_nbits: int = PQ_NBITS,
+    hnsw_m: int = HNSW_M,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    ef_search: int = HNSW_EF_SEARCH,
+    train_sample: int = TRAIN_SAMPLE,
+):
+    """
+    Build (and train, if needed) a FAISS index over float32 embeddings.
+    With `ids`, vectors are added under those stable int64 ids (IVF indexes
+    support this natively, flat/HNSW are wrapped in IndexIDMap2).
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits)
+        # nprobe is stored with the index, so readers get it by default
+        index.nprobe = min(nprobe, nlist)
+        # IVF needs enough points per centroid, PQ needs 2**nbits per sub-quantizer
+        n_train = max(train_sample, 39 * nlist, 2 ** pq_nbits if index_type == "ivf_pq" else 0)
+        sample = training_sample(embeddings, n_train)
+        print(f"Training {index_type} (nlist={nlist}) on {len(sample)} vectors...")
+        index.train(sample)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if ids is not None and index_type in ("flat", "hnsw"):
+        index = faiss.IndexIDMap2(index)
+
+    add_vectors(index, embeddings, ids)
+    return index
+
+
+def add_vectors(index, embeddings: np.ndarray, ids: np.ndarray = None):
+    for start in range(0, len(embeddings), ADD_BATCH_SIZE):
+        chunk = embeddings[start:start + ADD_BATCH_SIZE]
+        if ids is None:
+            index.add(chunk)
+        else:
+            index.add_with_ids(chunk, ids[start:start + ADD_BATCH_SIZE].astype(np.int64))
+
+
+def embed_documents(embedder, documents: list, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    return embedder.encode(
+        documents, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=True
+    ).astype(np.float32)
+
+
+# ---------------- GENERATIONS ----------------
+# vector_store/
+#   CURRENT              name of the live generation, swapped atomically
+#   gen-000004/
+#     index.faiss        vectors under stable ids
+#     docs.bin           passages indexed by id (see doc_store.py),
+#     docs.offsets.npy   empty for deleted documents
+#     manifest.json      content hash -> id, next_id, tombstones
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def current_generation(store_dir: str = DB_OUTPUT_DIR):
+    """Path of the live generation, or None for a legacy/empty store"""
+    pointer = os.path.join(store_dir, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, encoding="utf-8") as f:
+        return os.path.join(store_dir, f.read().strip())
+
+
+def write_generation(index, docs: list, manifest: dict, store_dir: str = DB_OUTPUT_DIR, keep: int = 2):
+    """Write a new generation next to the live one, then flip CURRENT to it"""
+    os.makedirs(store_dir, exist_ok=True)
+    name = f"gen-{manifest['generation']:06d}"
+    final_dir = os.path.join(store_dir, name)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+    write_doc_store(docs, tmp_dir)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
 
-    documents = documents[:5000] 
+    shutil.rmtree(final_dir, ignore_errors=True)  # leftover from an aborted run
+    os.rename(tmp_dir, final_dir)
+
+    pointer_tmp = os.path.join(store_dir, "CURRENT.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(store_dir, "CURRENT"))
+
+    # Old generations may still be open in running servers; keep a few
+    generations = sorted(d for d in os.listdir(store_dir) if d.startswith("gen-") and not d.endswith(".tmp"))
+    for old in generations[:-keep]:
+        shutil.rmtree(os.path.join(store_dir, old), ignore_errors=True)
+
+    return final_dir
+
+
+def index_sources(extra: list = None, manifest: dict = None) -> list:
+    """
+    DATASET_PATH, every source an earlier generation indexed, then `extra`.
+    --source adds to the corpus, it never replaces it; dropping a source
+    takes a full (non-incremental) build without it.
+    """
+    sources = [DATASET_PATH] + list((manifest or {}).get("sources", [])) + list(extra or [])
+    return list(dict.fromkeys(sources))
+
+
+def read_sources(paths: list) -> list:
+    documents, seen = [], set()
+    for path in paths:
+        for text in load_documents(path):
+            if text not in seen:
+                seen.add(text)
+                documents.append(text)
+    return documents
+
+
+def create_vector_db(index_type: str = INDEX_TYPE, sources: list = None):
+    sources = index_sources(sources)
+
+    print(f"Loading embedding model: {MODEL_NAME}...")
+    embedder = load_embedder()
+
+    print(f"Reading {', '.join(sources)}...")
+    documents = read_sources(sources)
     print(f"Loaded {len(documents)} documents for indexing.")
 
     if not documents:
@@ -40,20 +225,116 @@ def create_vector_db():
         return
 
     print("Generating embeddings (this may take a while)...")
-    embeddings = embedder.encode(documents, convert_to_numpy=True, show_progress_bar=True)
+    embeddings = embed_documents(embedder, documents)
+
+    print(f"Building FAISS index ({index_type})...")
+    ids = np.arange(len(documents), dtype=np.int64)
+    index = build_index(embeddings, ids=ids, index_type=index_type)
+
+    previous = current_generation()
+    generation = 1
+    if previous:
+        with open(os.path.join(previous, "manifest.json"), encoding="utf-8") as f:
+            generation = json.load(f)["generation"] + 1
+
+    manifest = {
+        "generation": generation,
+        "index_type": index_type,
+        "next_id": len(documents),
+        "hashes": {content_hash(d): i for i, d in enumerate(documents)},
+        "tombstones": [],
+        "sources": sources,
+    }
+    path = write_generation(index, documents, manifest)
+    print(f"Vector DB creation complete! ({path})")
+
+
+def update_vector_db(sources: list = None):
+    """
+    Incremental update: embed only documents whose content hash is new,
+    add them under fresh ids, delete (or tombstone) documents that are
+    gone, and publish the result as a new generation.
+    """
+    live = current_generation()
+    if live is None:
+        print("No generation found, doing a full build first.")
+        return create_vector_db(sources=sources)
+
+    index = faiss.read_index(os.path.join(live, "index.faiss"))
+    docs = load_docs(live)
+    if not isinstance(docs, list):
+        docs = docs.to_list()
+    with open(os.path.join(live, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    manifest_sources = manifest.get("sources")
+    sources = index_sources(sources, manifest)
+    manifest["sources"] = sources
+    print(f"Reading {', '.join(sources)}...")
+    documents = read_sources(sources)
+    wanted = {content_hash(d): d for d in documents}
+    hashes = manifest["hashes"]
+
+    added = [h for h in wanted if h not in hashes]
+    removed = [h for h in hashes if h not in wanted]
+    print(f"{len(added)} new/changed, {len(removed)} deleted, {len(hashes) - len(removed)} unchanged.")
+
+    if not added and not removed:
+        # A new --source with nothing new in it is still remembered
+        if sources != manifest_sources:
+            tmp = os.path.join(live, "manifest.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, os.path.join(live, "manifest.json"))
+        print("Vector DB is up to date.")
+        return
+
+    if removed:
+        removed_ids = np.array([hashes.pop(h) for h in removed], dtype=np.int64)
+        try:
+            index.remove_ids(removed_ids)
+        except RuntimeError:
+            # HNSW cannot delete; keep the vectors but hide them at search time
+            manifest["tombstones"].extend(int(i) for i in removed_ids)
+        for i in removed_ids:
+            docs[i] = None
+
+    if added:
+        print(f"Loading embedding model: {MODEL_NAME}...")
+        embedder = load_embedder()
+        texts = [wanted[h] for h in added]
+        embeddings = embed_documents(embedder, texts)
 
-    print("Building FAISS index...")
-    embedding_dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(embedding_dim)
-    index.add(embeddings)
+        start = manifest["next_id"]
+        ids = np.arange(start, start + len(texts), dtype=np.int64)
+        add_vectors(index, embeddings, ids)
 
-    print(f"Saving to {DB_OUTPUT_DIR}...")
-    faiss.write_index(index, f"{DB_OUTPUT_DIR}/index.faiss")
-    
-    with open(f"{DB_OUTPUT_DIR}/docs.pkl", "wb") as f:
-        pickle.dump(documents, f)
+        docs.extend(texts)
+        for h, i in zip(added, ids):
+            hashes[h] = int(i)
+        manifest["next_id"] = start + len(texts)
 
-    print("Vector DB creation complete!")
+    manifest["generation"] += 1
+    path = write_generation(index, docs, manifest)
+    print(f"Vector DB updated: {path}")
 
 if __name__ == "__main__":
-    create_vector_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the RAG vector store")
+    parser.add_argument(
+        "--index-type", default=INDEX_TYPE,
+        choices=["flat", "ivf_flat", "ivf_pq", "hnsw"],
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="embed only new/changed documents and publish a new generation",
+    )
+    parser.add_argument(
+        "--source", action="append",
+        help="extra JSONL file to index alongside the dataset (repeatable), e.g. the risk "
+             "service complaint feed; remembered by later --incremental runs",
+    )
+    args = parser.parse_args()
+    if args.incremental:
+        update_vector_db(sources=args.source)
+    else:
+        create_vector_db(index_type=args.index_type, sources=args.source)
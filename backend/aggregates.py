@@ -0,0 +1,121 @@
+import random
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = "complaint_stats"
+# Counted per value; "open_severity" is severity among open complaints
+DIMENSIONS = ("status", "severity", "open_severity", "location", "date")
+
+
+def complaint_counts(doc: dict) -> Counter:
+    """(dimension, value) -> 1 for every counter one complaint contributes to"""
+    created = doc.get("created_at")
+    if not isinstance(created, datetime):
+        created = datetime.now(timezone.utc)
+
+    counts = Counter({("total", None): 1})
+    counts[("status", doc.get("status") or "open")] += 1
+    counts[("severity", doc.get("severity") or "Unknown")] += 1
+    counts[("location", doc.get("location") or "Unknown")] += 1
+    counts[("date", created.astimezone(timezone.utc).strftime("%Y-%m-%d"))] += 1
+    if (doc.get("status") or "open") == "open":
+        counts[("open_severity", doc.get("severity") or "Unknown")] += 1
+    return counts
+
+
+class ComplaintStats:
+    """
+    Dashboard counters (totals by status, severity, location and day),
+    kept as Firestore sharded counters next to the complaints.
+
+    Each write picks one of `shards` documents at random and applies
+    firestore.Increment to it, so concurrent writers rarely contend on a
+    document; a bulk insert is folded into a single increment write.
+    Reading the summary costs `shards` document reads, however many
+    complaints exist. rebuild() recounts everything from the complaints
+    collection, for first use or after drift.
+    """
+
+    def __init__(self, db, shards: int = 10, collection: str = STATS_COLLECTION):
+        self.db = db
+        self.shards = max(1, shards)
+        self.collection = collection
+
+    def _shard(self, n: Optional[int] = None):
+        n = random.randrange(self.shards) if n is None else n
+        return self.db.collection(self.collection).document(f"shard-{n}")
+
+    @staticmethod
+    def _as_fields(counts: Counter, value_of=lambda n: n) -> dict:
+        fields = {}
+        for (dim, key), n in counts.items():
+            if not n:
+                continue
+            if dim == "total":
+                fields["total"] = value_of(n)
+            else:
+                fields.setdefault(dim, {})[key] = value_of(n)
+        return fields
+
+    def _increment(self, counts: Counter):
+        if not counts:
+            return
+        try:
+            self._shard().set(self._as_fields(counts, firestore.Increment), merge=True)
+        except Exception as e:
+            # Counters are derived data: keep the write path up, rebuild() repairs drift
+            logger.warning(f"Failed to update complaint stats: {e}")
+
+    def record_new(self, docs: Iterable[dict]):
+        """Count newly stored complaint documents"""
+        counts = Counter()
+        for doc in docs:
+            counts.update(complaint_counts(doc))
+        self._increment(counts)
+
+    def record_resolved(self, doc: dict):
+        """Move a complaint (its data before the update) from open to closed"""
+        if (doc.get("status") or "open") != "open":
+            return
+        severity = doc.get("severity") or "Unknown"
+        self._increment(Counter({
+            ("status", "open"): -1,
+            ("status", "closed"): 1,
+            ("open_severity", severity): -1,
+        }))
+
+    def summary(self) -> dict:
+        totals = {dim: Counter() for dim in DIMENSIONS}
+        total = 0
+        for snap in self.db.collection(self.collection).stream():
+            data = snap.to_dict() or {}
+            total += data.get("total", 0)
+            for dim in DIMENSIONS:
+                totals[dim].update(data.get(dim) or {})
+
+        out = {"total": total}
+        for dim, counter in totals.items():
+            # Sorted for stable output; days chronologically, the rest by count
+            items = sorted(counter.items()) if dim == "date" else counter.most_common()
+            out[dim] = {k: n for k, n in items if n}
+        return out
+
+    def rebuild(self, complaints_collection: str = "complaints") -> dict:
+        """Recount from the complaints themselves and overwrite every shard"""
+        fields = ["status", "severity", "location", "created_at"]
+        counts = Counter()
+        for snap in self.db.collection(complaints_collection).select(fields).stream():
+            counts.update(complaint_counts(snap.to_dict()))
+
+        batch = self.db.batch()
+        batch.set(self._shard(0), self._as_fields(counts))
+        for n in range(1, self.shards):
+            batch.set(self._shard(n), {})
+        batch.commit()
+        return self.summary()
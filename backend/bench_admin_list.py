@@ -0,0 +1,124 @@
+"""
+GET /admin/complaints: full listing vs projected, cursor-paginated pages.
+
+Seeds N complaints, then times the original full listing against the
+first page (cold and cached) and a walk over every page, and checks that
+the pages cover exactly the documents of the full listing.
+
+Against the Firestore emulator (start it with
+`gcloud emulators firestore start --host-port=localhost:8080`):
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_admin_list.py --docs 5000
+Without the emulator the in-memory fake is used:
+    python bench_admin_list.py --docs 5000
+"""
+import os
+import json
+import time
+import random
+import argparse
+
+from firebase_admin import firestore
+
+from complaint_queries import COLLECTION, ComplaintLists
+from firestore_writer import BulkComplaintWriter, InMemoryFirestore
+
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+BODY = (
+    "Garbage has not been collected for over two weeks and the smell is unbearable. "
+    "Residents have complained repeatedly to the ward office without any response. "
+) * 6
+
+
+def connect():
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcloud_firestore
+        return gcloud_firestore.Client(project=os.getenv("FIRESTORE_PROJECT", "civicmind-bench")), "emulator"
+    return InMemoryFirestore(), "memory"
+
+
+def seed(db, backend: str, docs: int):
+    if backend == "emulator":
+        # Start from an empty collection so reruns compare like with like
+        for doc in db.collection(COLLECTION).stream():
+            doc.reference.delete()
+
+    rnd = random.Random(7)
+    writer = BulkComplaintWriter(db)
+    writer.write([
+        {
+            "filename": f"complaint_{i}.pdf",
+            "subject": f"Complaint {i}",
+            "complaint": BODY,
+            "sender": "Residents Welfare Association",
+            "date": "2024-05-01",
+            "location": f"Zone {rnd.randint(1, 9)}",
+            "population_used": rnd.choice([50, 500, 1200, 5000]),
+            "ocr_used": False,
+            "risk_score": round(rnd.uniform(0, 100), 2),
+            "severity": rnd.choice(SEVERITIES),
+            "status": rnd.choice(["open", "open", "closed"]),
+            "created_at": firestore.SERVER_TIMESTAMP,
+        }
+        for i in range(docs)
+    ])
+    writer.close()
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - t0) * 1000
+
+
+def size_kb(value) -> float:
+    return len(json.dumps(value, default=str)) / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--page-size", type=int, default=50)
+    args = ap.parse_args()
+
+    db, backend = connect()
+    seed(db, backend, args.docs)
+    no_filters = {}
+    print(f"backend={backend} docs={args.docs} page_size={args.page_size}")
+    print(f"{'request':28} {'ms':>9} {'KB':>9}")
+
+    lists = ComplaintLists(db)
+    full, ms = timed(lambda: lists.all(no_filters))
+    print(f"{'full listing':28} {ms:9.1f} {size_kb(full):9.1f}")
+
+    lists = ComplaintLists(db)
+    page, ms = timed(lambda: lists.page(no_filters, args.page_size))
+    print(f"{'first page (cold)':28} {ms:9.1f} {size_kb(page):9.1f}")
+    _, ms = timed(lambda: lists.page(no_filters, args.page_size))
+    print(f"{'first page (cached)':28} {ms:9.1f}")
+
+    filtered = {"status": "open", "severity": "Critical"}
+    page, ms = timed(lambda: lists.page(filtered, args.page_size))
+    print(f"{'open+Critical page (cold)':28} {ms:9.1f} {size_kb(page):9.1f}")
+
+    def walk():
+        ids, cursor, pages = [], None, 0
+        while True:
+            page = lists.page(no_filters, args.page_size, cursor)
+            ids.extend(item["id"] for item in page["items"])
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids, pages
+
+    lists.invalidate()
+    (ids, pages), ms = timed(walk)
+    print(f"{f'all {pages} pages':28} {ms:9.1f}")
+
+    expected = [doc["id"] for doc in full]
+    assert len(ids) == len(set(ids)), "pages overlap"
+    assert set(ids) == set(expected), "pages do not cover the full listing"
+    print("pagination check: pages cover every document exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Embedding throughput, single-query latency and parity: torch vs ONNX.
+
+Run from the backend/ directory after exporting the ONNX model:
+    python embeddings.py export --quantize
+    python bench_embeddings.py --texts 2000 --queries 200
+
+Texts are complaint-like sentences of mixed length. Parity is the cosine
+of each ONNX embedding to the torch embedding of the same text (min/mean).
+"""
+import time
+import random
+import argparse
+
+import numpy as np
+
+from embeddings import ONNX_MODEL_DIR, PARITY_SENTENCES, PARITY_TOLERANCE, OnnxEmbedder, TorchEmbedder, cosine_parity
+
+ISSUES = ["garbage pile", "water leakage", "broken street light", "pothole", "sewage overflow",
+          "illegal dumping", "power outage", "blocked drain", "stray animals", "damaged footpath"]
+PLACES = ["near the school", "in Zone 3", "behind the market", "on the highway", "at the bus stand"]
+
+
+def make_texts(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        parts = [f"There is a {rng.choice(ISSUES)} {rng.choice(PLACES)}."]
+        parts += [rng.choice(PARITY_SENTENCES) for _ in range(rng.randint(0, 6))]
+        texts.append(" ".join(parts))
+    return texts
+
+
+def bench(embedder, texts: list, queries: list, batch_size: int) -> dict:
+    embedder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    embeddings = embedder.encode(texts, batch_size=batch_size)
+    throughput = len(texts) / (time.perf_counter() - t0)
+
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        embedder.encode([q])
+        lat.append((time.perf_counter() - t0) * 1000)
+    return {
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+        "per_sec": throughput,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    args = ap.parse_args()
+
+    texts = make_texts(args.texts)
+    queries = make_texts(args.queries, seed=1)
+    variants = [
+        ("torch", TorchEmbedder, None),
+        ("onnx fp32", lambda: OnnxEmbedder(args.model_dir, quantized=False), "fp32"),
+        ("onnx int8", lambda: OnnxEmbedder(args.model_dir, quantized=True), "int8"),
+    ]
+
+    reference = None
+    print(f"{'backend':10} {'texts/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'min cos':>8} {'mean cos':>9}")
+    for name, build, variant in variants:
+        try:
+            embedder = build()
+        except Exception as e:
+            print(f"{name:10} skipped ({e})")
+            continue
+        r = bench(embedder, texts, queries, args.batch_size)
+        if variant is None:
+            reference = r["embeddings"]
+        if reference is None:
+            parity = f"{'-':>8} {'-':>9}"
+        else:
+            cos = cosine_parity(reference, r["embeddings"])
+            flag = "" if variant is None or cos.min() >= PARITY_TOLERANCE[variant] else "  below tolerance"
+            parity = f"{cos.min():8.5f} {cos.mean():9.5f}{flag}"
+        print(f"{name:10} {r['per_sec']:9.0f} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {parity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Golden-output check and docs/sec microbenchmark for the text extractors.
+
+    python bench_extraction.py [--repeat 2000]
+
+Fails if extract_fields(), the individual extractors or the frozen
+baseline disagree with fixtures/extraction_golden.jsonl (outputs recorded
+from the original per-function implementation), or if a mixed PDF (text
+letter, scanned page, text annexure) parsed with the early OCR stop gives
+other fields than its full text layer. "before" times the
+baseline: a copy of the regex cascade as it was in risk.py before
+extraction.py, kept here so it does not drift with the library.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Optional
+
+import fitz
+
+from extraction import (
+    extract_body, extract_complaint, extract_date, extract_fields,
+    extract_sender, extract_subject, extract_zone, resolve_population,
+)
+from parsers import parse_pdf
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "extraction_golden.jsonl")
+
+
+# ---------------- BASELINE (frozen, do not optimize) ----------------
+
+def baseline_subject(raw_text: str) -> Optional[str]:
+    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
+    for l in lines[:5]:
+        m = re.match(r"(?i)^subject[\s:\-]+(.+)", l)
+        if m:
+            return m.group(1).strip()
+    first = lines[0] if lines else ""
+    if 5 < len(first) < 120:
+        return first
+    return None
+
+
+def baseline_sender(raw_text: str) -> str:
+    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
+    for l in reversed(lines):
+        m = re.match(r"(?i)^sender[\s:\-]+(.+)", l)
+        if m:
+            return m.group(1).strip()
+    for l in reversed(lines[-5:]):
+        if any(k in l.lower() for k in [
+            "committee", "association", "residents",
+            "society", "citizens", "welfare"
+        ]):
+            return l
+    return "Anonymous"
+
+
+def baseline_date(text: str) -> str:
+    t = re.sub(r"\s+", " ", text)
+    patterns = [
+        r"\b\d{1,2}\s*(January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{4}\b",
+        r"\b\d{1,2}\s*(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\s*\d{4}\b",
+        r"\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b",
+        r"\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b",
+    ]
+    for p in patterns:
+        m = re.search(p, t, re.I)
+        if m:
+            raw = m.group(0)
+            for fmt in ["%d %B %Y", "%d %b %Y", "%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d"]:
+                try:
+                    return datetime.strptime(raw, fmt).strftime("%Y-%m-%d")
+                except ValueError:
+                    pass
+            return raw
+    return "Not mentioned"
+
+
+def baseline_zone(text: str) -> Optional[str]:
+    # extract_location without the spaCy fallback
+    t = re.sub(r"\s+", " ", text)
+    zone_patterns = [
+        r"\bzone\s*[-:]?\s*\d+\b",
+        r"\bz\s*o\s*n\s*e\s*\d+\b",
+    ]
+    for p in zone_patterns:
+        m = re.search(p, t, re.I)
+        if m:
+            return m.group(0).replace(" ", "").title().replace("-", " ")
+    return None
+
+
+def baseline_body(raw_text: str) -> str:
+    text = raw_text.replace("\r", "\n")
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    complaint_lines = []
+    for line in lines:
+        if re.match(r"(?i)^subject\s*[:\-]", line):
+            continue
+        if re.match(r"(?i)^(to|from)\s*[:\-]", line):
+            continue
+        if re.match(r"(?i)^(date|location|sender|address)\s*[:\-]", line):
+            continue
+        if re.search(r"(?i)(yours sincerely|yours faithfully|with regards|thank you)", line):
+            break
+        comma_count = line.count(",")
+        title_word_ratio = sum(w.istitle() for w in line.split()) / max(1, len(line.split()))
+        if comma_count >= 2 and title_word_ratio > 0.6:
+            continue
+        if len(line) < 30:
+            continue
+        if not re.search(r"\b(is|are|has|have|was|were|remain|causing|resulting)\b", line, re.I):
+            if len(line) < 60:
+                continue
+        complaint_lines.append(line)
+    text = " ".join(complaint_lines)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def baseline_complaint(body_text: str) -> str:
+    if len(body_text) < 50:
+        return ""
+    sentences = [s.strip() for s in re.split(r"[.!?]", body_text) if len(s.strip()) > 20]
+    return ". ".join(sentences[:4])
+
+
+BASELINE_PEOPLE_WORDS = [
+    "people", "residents", "citizens",
+    "individuals", "families", "households", "population"
+]
+
+
+def baseline_population(text: str) -> int:
+    t = text.lower()
+    m = re.search(
+        r"(affecting|affected|impacting)\s+(approximately\s+)?([\d,]+)\s+"
+        r"(people|residents|citizens|individuals|families|households)",
+        t
+    )
+    if m:
+        return int(m.group(3).replace(",", ""))
+    if re.search(r"(thousands of|large number of|numerous)\s+(" + "|".join(BASELINE_PEOPLE_WORDS) + r")", t):
+        return 10000
+    if re.search(r"(many|several|multiple|large group of)\s+(" + "|".join(BASELINE_PEOPLE_WORDS) + r")", t):
+        return 3000
+    if re.search(r"(few|some|limited number of|nearby)\s+(" + "|".join(BASELINE_PEOPLE_WORDS) + r")", t):
+        return 800
+    return 500
+
+
+def baseline(raw: str) -> dict:
+    body = baseline_body(raw)
+    return {
+        "subject": baseline_subject(raw),
+        "sender": baseline_sender(raw),
+        "date": baseline_date(raw),
+        "zone": baseline_zone(raw),
+        "body": body,
+        "complaint": baseline_complaint(body),
+        "population": baseline_population(body),
+    }
+
+# ---------------- CURRENT ----------------
+
+
+def per_function(raw: str) -> dict:
+    # How process_complaints called the extractors before extract_fields
+    body = extract_body(raw)
+    return {
+        "subject": extract_subject(raw),
+        "sender": extract_sender(raw),
+        "date": extract_date(raw),
+        "zone": extract_zone(raw),
+        "body": body,
+        "complaint": extract_complaint(body),
+        "population": resolve_population(body),
+    }
+
+
+MIXED_PDF_PAGES = [
+    "Subject: Water leakage near the bus depot\n"
+    "To: The Municipal Commissioner\n\n"
+    "The main water pipeline near the bus depot has been leaking for two weeks, affecting approximately 2,500 residents.\n"
+    "The road has turned into a slushy mess and accidents are frequent.\n"
+    "Yours sincerely,\n"
+    "Sender: Green Park Residents Welfare Association",
+    None,  # scanned photo, no text layer
+    "Annexure: the leak was inspected on 12 March 2024 in Zone 7 by the ward engineer.",
+]
+
+
+def mixed_pdf() -> bytes:
+    pdf = fitz.open()
+    for text in MIXED_PDF_PAGES:
+        page = pdf.new_page()
+        if text is None:
+            pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 200, 200), False)
+            pix.clear_with(128)
+            page.insert_image(page.rect, pixmap=pix)
+        else:
+            page.insert_text((36, 72), text, fontsize=8)
+    return pdf.tobytes()
+
+
+def check_mixed_pdf() -> int:
+    """Skipping OCR after the letter must not drop fields found in later text pages"""
+    data = mixed_pdf()
+    with fitz.open(stream=data, filetype="pdf") as pdf:
+        expected = baseline("".join(page.get_text() for page in pdf))
+    text, _, report = parse_pdf(data)
+    got = extract_fields(text)
+    failures = 0
+    if report["skipped_pages"] != [2]:
+        failures += 1
+        print(f"mixed PDF: expected page 2 skipped, report {report}")
+    if got != expected:
+        failures += 1
+        print(f"mixed PDF mismatch:\n  expected {expected}\n  got      {got}")
+    return failures
+
+
+def docs_per_sec(fn, docs, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for d in docs:
+            fn(d)
+    return repeat * len(docs) / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    for i, case in enumerate(corpus):
+        for name, fn in (("baseline", baseline), ("extract_fields", extract_fields), ("per_function", per_function)):
+            got = fn(case["text"])
+            if got != case["expected"]:
+                failures += 1
+                print(f"[{i}] {name} mismatch:\n  expected {case['expected']}\n  got      {got}")
+    failures += check_mixed_pdf()
+    print(f"golden: {len(corpus)} documents + mixed PDF, {failures} mismatches")
+
+    docs = [case["text"] for case in corpus]
+    print(f"before       : {docs_per_sec(baseline, docs, args.repeat):10.0f} docs/s")
+    print(f"per-function : {docs_per_sec(per_function, docs, args.repeat):10.0f} docs/s")
+    print(f"single pass  : {docs_per_sec(extract_fields, docs, args.repeat):10.0f} docs/s")
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Parity and latency of the fast risk-scoring path (risk_scorer.py) against
+the sklearn wrapper it replaces: XGBRegressor.predict(scaler.transform(X)).
+
+Run from the backend/ directory (models are loaded with relative paths):
+    python bench_risk_model.py --rows 20000
+    python bench_risk_model.py --texts 2000     # real MiniLM embeddings
+
+Features are random unit vectors (the embedder is L2-normalized) plus
+populations, or embeddings of synthetic complaints with --texts. Parity
+compares raw scores and the rounded score / severity predict_risk returns;
+the run fails (exit 1) on any rounded score or severity mismatch.
+"""
+import time
+import random
+import argparse
+
+import numpy as np
+
+from models import registry
+from risk import severity_labels
+
+BATCH_SIZES = (1, 64, 4096)
+
+
+def synthetic_features(rows: int, texts: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    populations = rng.integers(10, 200_000, size=rows)
+    if texts:
+        from bench_scoring import ISSUES, IMPACT
+        from risk import embed_texts
+        rnd = random.Random(seed)
+        sentences = [f"{rnd.choice(ISSUES)} in Zone {rnd.randint(1, 9)} {rnd.choice(IMPACT)}." for _ in range(texts)]
+        emb = embed_texts(sentences)
+        emb = emb[rng.integers(0, len(emb), size=rows)]
+    else:
+        dim = registry.get("scaler").n_features_in_ - 1
+        emb = rng.standard_normal((rows, dim)).astype(np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb, populations
+
+
+def reference_scores(emb: np.ndarray, populations) -> np.ndarray:
+    """The scoring path before risk_scorer.py"""
+    pop = np.log1p(np.asarray(populations, dtype=np.float64)).reshape(-1, 1)
+    X = np.hstack([emb, pop])
+    return registry.get("risk_model").predict(registry.get("scaler").transform(X)).astype(np.float64)
+
+
+def latency(fn, emb, populations, batch_size: int, calls: int) -> dict:
+    n = len(emb)
+    lat = []
+    for c in range(calls):
+        start = (c * batch_size) % max(1, n - batch_size)
+        e, p = emb[start:start + batch_size], populations[start:start + batch_size]
+        t0 = time.perf_counter()
+        fn(e, p)
+        lat.append(time.perf_counter() - t0)
+    lat = np.asarray(lat)
+    return {
+        "p50_ms": float(np.percentile(lat, 50) * 1000),
+        "p99_ms": float(np.percentile(lat, 99) * 1000),
+        "rows_per_sec": batch_size * calls / lat.sum(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--texts", type=int, default=0, help="embed this many synthetic complaints")
+    ap.add_argument("--calls", type=int, default=200)
+    args = ap.parse_args()
+
+    emb, populations = synthetic_features(max(args.rows, max(BATCH_SIZES)), args.texts)
+    scorer = registry.get("risk_scorer")
+
+    # ---- parity ----
+    ref = reference_scores(emb, populations)
+    fast = scorer.score(emb, populations)
+    ref_rounded, fast_rounded = np.round(ref, 2), np.round(fast, 2)
+    score_mismatches = int((ref_rounded != fast_rounded).sum())
+    severity_mismatches = int((severity_labels(ref) != severity_labels(fast)).sum())
+    print(f"{len(emb)} rows")
+    print(f"max |raw score diff|   = {np.abs(ref - fast).max():.3g}")
+    print(f"rounded score mismatch = {score_mismatches}")
+    print(f"severity mismatches    = {severity_mismatches}")
+
+    # ---- latency ----
+    print(f"\n{'batch':>6} {'path':10} {'p50 ms':>9} {'p99 ms':>9} {'rows/s':>11}")
+    for batch_size in BATCH_SIZES:
+        calls = max(5, args.calls if batch_size < 1000 else args.calls // 20)
+        for name, fn in (("sklearn", reference_scores), ("fast", scorer.score)):
+            fn(emb[:batch_size], populations[:batch_size])  # warm-up
+            r = latency(fn, emb, populations, batch_size, calls)
+            print(f"{batch_size:6} {name:10} {r['p50_ms']:9.3f} {r['p99_ms']:9.3f} {r['rows_per_sec']:11.0f}")
+
+    if score_mismatches or severity_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
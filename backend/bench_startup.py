@@ -0,0 +1,117 @@
+"""
+Worker startup time and per-worker memory of the risk service.
+
+Run from the backend/ directory (Linux: memory is read from /proc):
+    FIRESTORE_BACKEND=memory python bench_startup.py --workers 4
+
+startup   time to import risk.py (what a worker pays before serving) with
+          lazy models vs PRELOAD_MODELS=all, and the first scoring call
+memory    N forked workers that each score one complaint, with the models
+          loaded once in the parent before fork (gunicorn --preload) vs
+          loaded by every worker after fork. PSS splits shared pages
+          between the processes that map them, so sum(PSS) is the real
+          footprint; private = pages only that worker holds.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+IMPORT_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+import risk
+t1 = time.perf_counter()
+risk.predict_risk("Garbage has not been collected in Zone 3 for two weeks", 500)
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_score": t2 - t1}))
+"""
+
+
+def smaps_kb(pid: int) -> dict:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                out[parts[0][:-1]] = int(parts[1])
+    return out
+
+
+def startup(preload: str) -> dict:
+    env = {**os.environ, "PRELOAD_MODELS": preload, "FIRESTORE_BACKEND": os.getenv("FIRESTORE_BACKEND", "memory")}
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def forked_workers(workers: int, preload: bool) -> list:
+    """Fork workers that each score once and report their memory; returns per-worker stats"""
+    import risk
+    from models import ML_MODELS, registry
+
+    if preload:
+        registry.preload(list(ML_MODELS))
+
+    pipes, pids = [], []
+    for _ in range(workers):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            risk.predict_risk("Water pipeline leaking near the market in Zone 5", 1200)
+            risk.extract_location("Water pipeline leaking near the market")
+            os.write(w, b"1")
+            time.sleep(3)  # stay alive while the parent samples
+            os._exit(0)
+        os.close(w)
+        pipes.append(r)
+        pids.append(pid)
+
+    for r in pipes:
+        os.read(r, 1)
+    stats = [smaps_kb(pid) for pid in pids]
+    for pid in pids:
+        os.waitpid(pid, 0)
+    return stats
+
+
+def memory(workers: int, preload: bool) -> dict:
+    # A fresh interpreter per variant so the two runs do not share state
+    code = (
+        "import json, bench_startup; "
+        f"print(json.dumps(bench_startup.forked_workers({workers}, {preload})))"
+    )
+    env = {**os.environ, "PRELOAD_MODELS": "", "FIRESTORE_BACKEND": os.getenv("FIRESTORE_BACKEND", "memory")}
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    stats = json.loads(out.stdout.strip().splitlines()[-1])
+    mb = lambda key: sum(s[key] for s in stats) / 1024
+    return {
+        "rss_per_worker": mb("Rss") / workers,
+        "pss_total": mb("Pss"),
+        "private_per_worker": (mb("Private_Clean") + mb("Private_Dirty")) / workers,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'startup':16} {'import s':>9} {'first score s':>14}")
+    for name, preload in (("lazy", ""), ("preload=all", "all")):
+        runs = [startup(preload) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["import"])
+        print(f"{name:16} {best['import']:9.2f} {best['first_score']:14.2f}")
+
+    print(f"\n{args.workers} forked workers")
+    print(f"{'models loaded':16} {'RSS/worker MB':>14} {'sum PSS MB':>11} {'private/worker MB':>18}")
+    for name, preload in (("per worker", False), ("before fork", True)):
+        m = memory(args.workers, preload)
+        print(f"{name:16} {m['rss_per_worker']:14.0f} {m['pss_total']:11.0f} {m['private_per_worker']:18.0f}")
+
+
+if __name__ == "__main__":
+    main()
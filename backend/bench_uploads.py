@@ -0,0 +1,140 @@
+"""
+Upload handling: temp file per upload (the old flow) vs in-memory buffers
+with spill-to-disk (uploads.py), parsing each file as it arrives.
+
+Run from the backend/ directory (Linux: write volume is read from /proc):
+    python bench_uploads.py                      # synthetic PDF/DOCX/CSV/XLSX
+    python bench_uploads.py path/to/fixtures --repeat 20 --spill-mb 8
+
+OCR is not involved: the synthetic PDFs have a text layer. "written" is
+the bytes the process passed to write() (/proc/self/io wchar), i.e. the
+upload copies this code put on disk. It does not include Starlette's
+multipart spool (on disk for files over 1 MB), which happens before the
+endpoint runs in both flows and is not exercised here.
+"""
+import io
+import os
+import time
+import argparse
+import tempfile
+
+import fitz
+import pandas as pd
+from docx import Document
+
+from parsers import SUPPORTED_EXTENSIONS, parse_file
+from uploads import UPLOAD_CHUNK_BYTES, BufferedUpload
+
+LETTER = (
+    "Subject: Water leakage in Zone {n}\n"
+    "The main water pipeline near the market has been leaking for three weeks "
+    "and the road is flooded every morning, affecting approximately 1,200 residents.\n"
+    "Yours sincerely\nResidents Welfare Association"
+)
+
+
+def synthetic_files() -> dict:
+    pdf = fitz.open()
+    for n in range(3):
+        pdf.new_page().insert_text((72, 72), LETTER.format(n=n))
+    doc = Document()
+    for line in LETTER.format(n=1).splitlines():
+        doc.add_paragraph(line)
+    docx = io.BytesIO()
+    doc.save(docx)
+    df = pd.DataFrame({
+        "subject": [f"Complaint {i}" for i in range(2000)],
+        "complaint": [LETTER.format(n=i % 9).splitlines()[1] for i in range(2000)],
+        "location": "", "date": "2024-05-01", "sender": "Residents Welfare Association",
+    })
+    xlsx = io.BytesIO()
+    df.head(500).to_excel(xlsx, index=False)
+    return {
+        "letter.pdf": pdf.tobytes(),
+        "letter.docx": docx.getvalue(),
+        "export.csv": df.to_csv(index=False).encode(),
+        "export.xlsx": xlsx.getvalue(),
+    }
+
+
+def folder_files(folder: str) -> dict:
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+            with open(os.path.join(folder, name), "rb") as f:
+                files[name] = f.read()
+    return files
+
+
+def chunks(data: bytes):
+    for start in range(0, len(data), UPLOAD_CHUNK_BYTES):
+        yield data[start:start + UPLOAD_CHUNK_BYTES]
+
+
+def via_temp_file(name: str, data: bytes):
+    """The old flow: copy to a NamedTemporaryFile, parse from disk, delete"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1]) as tmp:
+        for chunk in chunks(data):
+            tmp.write(chunk)
+    try:
+        return parse_file(tmp.name, name)
+    finally:
+        os.remove(tmp.name)
+
+
+def via_buffer(name: str, data: bytes, spill_bytes: int):
+    upload = BufferedUpload(name, spill_bytes=spill_bytes, max_bytes=0)
+    try:
+        for chunk in chunks(data):
+            upload.write(chunk)
+        upload.finish()
+        return parse_file(upload.source, name)
+    finally:
+        upload.close()
+
+
+def written_bytes() -> int:
+    with open("/proc/self/io") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("wchar:"))
+
+
+def run(files: dict, repeat: int, handle) -> dict:
+    for name, data in files.items():  # warm-up (imports, caches)
+        handle(name, data)
+    w0, t0 = written_bytes(), time.perf_counter()
+    outputs = [handle(name, data) for _ in range(repeat) for name, data in files.items()]
+    elapsed = time.perf_counter() - t0
+    return {
+        "files_per_sec": len(outputs) / elapsed,
+        "written_mb": (written_bytes() - w0) / (1024 * 1024),
+        "outputs": [o[:2] for o in outputs[:len(files)]],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("folder", nargs="?")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--spill-mb", type=float, default=8)
+    args = ap.parse_args()
+
+    files = folder_files(args.folder) if args.folder else synthetic_files()
+    total = sum(len(d) for d in files.values()) * args.repeat / (1024 * 1024)
+    spill = int(args.spill_mb * 1024 * 1024)
+    print(f"{len(files)} files x {args.repeat} = {total:.1f} MB uploaded")
+
+    variants = [
+        ("temp file", via_temp_file),
+        (f"spill {args.spill_mb:g} MB", lambda n, d: via_buffer(n, d, spill)),
+        ("spill always", lambda n, d: via_buffer(n, d, 0)),
+    ]
+    baseline = None
+    print(f"{'flow':16} {'files/s':>9} {'written MB':>11} {'same output':>12}")
+    for name, handle in variants:
+        r = run(files, args.repeat, handle)
+        baseline = baseline or r["outputs"]
+        print(f"{name:16} {r['files_per_sec']:9.1f} {r['written_mb']:11.1f} {str(r['outputs'] == baseline):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+
+def normalize_text(text: str) -> str:
+    # all-MiniLM-L6-v2 uses an uncased tokenizer that splits on whitespace,
+    # so case and spacing differences never change the embedding
+    return " ".join(text.lower().split())
+
+
+def content_key(text: str, *parts) -> str:
+    """Hash of the normalized text plus model version / extra inputs"""
+    h = hashlib.sha256(normalize_text(text).encode("utf-8"))
+    for p in parts:
+        h.update(b"\x00" + str(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+def file_version(*paths: str) -> str:
+    """Short content hash of model files, used as the model version"""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+class ContentCache:
+    """
+    Content-addressed cache with an in-process LRU tier (size + TTL bounded)
+    and an optional SQLite tier that survives restarts. Keys come from
+    content_key(); values are anything picklable (embeddings, scores).
+    Expired disk rows are deleted when they are read, and the disk tier is
+    pruned (oldest first) once it grows past `max_disk_rows`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_items: int = 10000,
+        ttl: Optional[float] = 3600.0,
+        disk_path: Optional[str] = None,
+        max_disk_rows: Optional[int] = None,
+    ):
+        self.name = name
+        self.max_items = max_items
+        self.ttl = ttl
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk_path = disk_path
+        self.max_disk_rows = max_disk_rows
+        self._conn = None
+        self._conn_pid = None
+        self._disk_rows = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self.disk_evictions = 0
+
+    @property
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        # Opened on first use in each process: a connection made before a
+        # fork (gunicorn --preload) must not be used by the children
+        if not self.disk_path:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.disk_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                "(key TEXT PRIMARY KEY, value BLOB, created REAL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_created ON {self._table} (created)")
+            conn.commit()
+            self._disk_rows = conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    @property
+    def _table(self) -> str:
+        return "cache_" + "".join(c if c.isalnum() else "_" for c in self.name)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key: str, value: Any, created: float):
+        self._mem[key] = (value, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        values = [None] * len(keys)
+        disk_lookup = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._mem.get(key)
+                if entry is not None and not self._expired(entry[1]):
+                    self._mem.move_to_end(key)
+                    values[i] = entry[0]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._mem[key]
+                    disk_lookup.append(i)
+
+            if self._disk is not None and disk_lookup:
+                wanted = list({keys[i] for i in disk_lookup})
+                found, expired = {}, []
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(wanted), 500):
+                    part = wanted[start:start + 500]
+                    for key, blob, created in self._disk.execute(
+                        f"SELECT key, value, created FROM {self._table} "
+                        f"WHERE key IN ({','.join('?' * len(part))})",
+                        part,
+                    ):
+                        if self._expired(created):
+                            expired.append(key)
+                        else:
+                            found[key] = (pickle.loads(blob), created)
+                if expired:
+                    self._delete(expired)
+
+                still_missing = []
+                for i in disk_lookup:
+                    entry = found.get(keys[i])
+                    if entry is None:
+                        still_missing.append(i)
+                        continue
+                    values[i] = entry[0]
+                    self._remember(keys[i], *entry)
+                    self.disk_hits += 1
+                disk_lookup = still_missing
+
+            self.misses += len(disk_lookup)
+
+        return values
+
+    def _delete(self, keys: List[str]):
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            self._disk.execute(f"DELETE FROM {self._table} WHERE key IN ({','.join('?' * len(part))})", part)
+        self._disk.commit()
+        self._disk_rows = max(0, self._disk_rows - len(keys))
+        self.disk_evictions += len(keys)
+
+    def _prune(self):
+        """Drop expired rows, then the oldest ones, down to 90% of max_disk_rows"""
+        # The headroom keeps a full table from being pruned on every write
+        disk = self._disk
+        before = self._disk_rows
+        if self.ttl is not None:
+            disk.execute(f"DELETE FROM {self._table} WHERE created < ?", (time.time() - self.ttl,))
+        disk.execute(
+            f"DELETE FROM {self._table} WHERE key IN "
+            f"(SELECT key FROM {self._table} ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (int(self.max_disk_rows * 0.9),),
+        )
+        disk.commit()
+        self._disk_rows = disk.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+        self.disk_evictions += max(0, before - self._disk_rows)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def set_many(self, items: List[tuple]):
+        now = time.time()
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value, now)
+            if self._disk is not None and items:
+                self._disk.executemany(
+                    f"INSERT OR REPLACE INTO {self._table} (key, value, created) VALUES (?, ?, ?)",
+                    [(key, pickle.dumps(value), now) for key, value in items],
+                )
+                self._disk.commit()
+                # Counts replaced keys too, so this over-estimates until _prune recounts
+                self._disk_rows += len(items)
+                if self.max_disk_rows is not None and self._disk_rows > self.max_disk_rows:
+                    self._prune()
+
+    def set(self, key: str, value: Any):
+        self.set_many([(key, value)])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._mem),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
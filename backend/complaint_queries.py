@@ -0,0 +1,117 @@
+import json
+import base64
+import hashlib
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+from firebase_admin import firestore
+
+from cache import ContentCache
+
+COLLECTION = "complaints"
+
+# Everything a list view needs; the complaint body is fetched only on request
+LIST_FIELDS = [
+    "filename", "subject", "sender", "date", "location", "population_used", "ocr_used",
+    "risk_score", "severity", "priority", "status", "created_at", "resolved_at",
+]
+FILTER_FIELDS = ("status", "severity", "priority", "location")
+MAX_PAGE_SIZE = 500
+# Orders by document id; what FieldPath.document_id() resolves to, and
+# firebase_admin.firestore does not re-export FieldPath
+DOCUMENT_ID = "__name__"
+
+
+# ---------------- CURSORS ----------------
+def encode_cursor(created_at, doc_id: str) -> str:
+    payload = json.dumps([created_at.isoformat(), doc_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return [datetime.fromisoformat(created_at), doc_id]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ---------------- QUERIES ----------------
+class ComplaintLists:
+    """
+    Filtered, projected and cursor-paginated reads of the complaints
+    collection, ordered newest first (created_at, then document id so
+    equal timestamps still page deterministically).
+
+    Responses are kept for `ttl` seconds. Every write that changes a list
+    (new complaints, resolve) calls invalidate(), which bumps a version
+    that is part of the cache key, so this process never serves a list
+    from before its own writes; other workers catch up within `ttl`.
+    """
+
+    def __init__(self, db, ttl: float = 15.0, max_items: int = 256):
+        self.db = db
+        self.cache = ContentCache("complaint_lists", max_items=max_items, ttl=ttl)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _filtered(self, filters: dict):
+        query = self.db.collection(COLLECTION)
+        for field in FILTER_FIELDS:
+            if filters.get(field):
+                query = query.where(field, "==", filters[field])
+        return query
+
+    def _cached(self, key_parts: tuple, load):
+        # Not content_key(): that normalizes case and whitespace, and filter
+        # values and cursors are case-sensitive
+        payload = json.dumps([key_parts, self._version], sort_keys=True)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        value = self.cache.get(key)
+        if value is None:
+            value = load()
+            self.cache.set(key, value)
+        return value
+
+    def all(self, filters: dict) -> List[dict]:
+        """Every matching complaint with every field (the original response)"""
+        def load():
+            query = self._filtered(filters).order_by(
+                "created_at", direction=firestore.Query.DESCENDING
+            )
+            return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+        return self._cached(("all", filters), load)
+
+    def page(self, filters: dict, limit: int, cursor: Optional[str] = None,
+             fields: Optional[List[str]] = None) -> dict:
+        """One page of `limit` complaints and the cursor of the next page"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        fields = list(fields or LIST_FIELDS)
+        if "created_at" not in fields:
+            fields.append("created_at")  # needed for the next cursor
+
+        def load():
+            query = (
+                self._filtered(filters)
+                .order_by("created_at", direction=firestore.Query.DESCENDING)
+                .order_by(DOCUMENT_ID, direction=firestore.Query.DESCENDING)
+                .select(fields)
+            )
+            if cursor:
+                query = query.start_after(decode_cursor(cursor))
+            # One extra document tells us whether there is a next page
+            docs = list(query.limit(limit + 1).stream())
+
+            items = [{"id": doc.id, **doc.to_dict()} for doc in docs[:limit]]
+            next_cursor = None
+            if len(docs) > limit:
+                next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+            return {"items": items, "next_cursor": next_cursor}
+
+        return self._cached(("page", filters, limit, cursor, fields), load)
@@ -0,0 +1,150 @@
+import time
+import threading
+from collections import deque
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+
+class DuplicateIndex:
+    """
+    Recent complaint embeddings, one exact inner-product FAISS index per
+    location/zone, for spotting repeat reports of the same issue.
+
+    match() labels each new complaint as a duplicate of an indexed cluster
+    head (cosine >= threshold, same zone), of an earlier complaint in the
+    same batch, or as new. New complaints are added with add() once they
+    have a document id. Entries leave the index after `window` seconds or
+    when a zone holds more than `max_per_zone` of them (oldest first).
+    A zone of None (location unknown) is never deduplicated: such
+    complaints are always new and are not indexed.
+
+    The index lives in this process and starts empty, so each worker only
+    deduplicates against what it ingested itself during the window.
+    """
+
+    def __init__(self, dim: Optional[int] = None, threshold: float = 0.93, window: float = 72 * 3600,
+                 max_per_zone: int = 5000):
+        self.dim = dim
+        self.threshold = threshold
+        self.window = window
+        self.max_per_zone = max_per_zone
+        self._zones = {}     # zone -> (IndexIDMap2, deque[(id, added)])
+        self._entries = {}   # id -> (doc_id, risk_analysis)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.checked = self.index_duplicates = self.batch_duplicates = self.evicted = 0
+
+    @staticmethod
+    def normalize(embeddings) -> np.ndarray:
+        vecs = np.array(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        faiss.normalize_L2(vecs)
+        return vecs
+
+    def _zone(self, zone: str, dim: int):
+        # dim may only be known once the first vectors arrive
+        self.dim = self.dim or dim
+        if zone not in self._zones:
+            self._zones[zone] = (faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim)), deque())
+        return self._zones[zone]
+
+    def _evict(self, zone: str):
+        index, order = self._zones[zone]
+        cutoff = time.time() - self.window
+        gone = []
+        while order and (order[0][1] < cutoff or len(order) > self.max_per_zone):
+            gone.append(order.popleft()[0])
+        if gone:
+            index.remove_ids(np.array(gone, dtype=np.int64))
+            for i in gone:
+                self._entries.pop(i, None)
+            self.evicted += len(gone)
+
+    def match(self, zones: List[str], vecs: np.ndarray) -> List[Optional[dict]]:
+        """
+        For each (normalized) vector: None if new, {"doc_id", "risk_analysis",
+        "similarity"} for an indexed duplicate, or {"batch_head": i,
+        "similarity"} for a duplicate of item i earlier in this batch.
+        """
+        out = [None] * len(zones)
+        groups = {}
+        for i, zone in enumerate(zones):
+            if zone is not None:
+                groups.setdefault(zone, []).append(i)
+
+        with self._lock:
+            self.checked += sum(len(idxs) for idxs in groups.values())
+            for zone, idxs in groups.items():
+                index, _ = self._zone(zone, vecs.shape[1])
+                self._evict(zone)
+                if index.ntotal:
+                    scores, ids = index.search(vecs[idxs], 1)
+                    for i, score, entry_id in zip(idxs, scores[:, 0], ids[:, 0]):
+                        if entry_id != -1 and score >= self.threshold:
+                            doc_id, risk_analysis = self._entries[int(entry_id)]
+                            out[i] = {
+                                "doc_id": doc_id,
+                                "risk_analysis": dict(risk_analysis),
+                                "similarity": round(float(score), 4),
+                            }
+                            self.index_duplicates += 1
+
+                # Greedy clustering of what is left: first occurrence is the head
+                rest = [i for i in idxs if out[i] is None]
+                if len(rest) > 1:
+                    sims = vecs[rest] @ vecs[rest].T
+                    heads = []
+                    for a, i in enumerate(rest):
+                        if heads:
+                            best = max(heads, key=lambda h: sims[a, h])
+                            if sims[a, best] >= self.threshold:
+                                out[i] = {"batch_head": rest[best], "similarity": round(float(sims[a, best]), 4)}
+                                self.batch_duplicates += 1
+                                continue
+                        heads.append(a)
+        return out
+
+    def add(self, zones: List[str], vecs: np.ndarray, doc_ids: List[str], risk_analyses: List[dict]):
+        """Index new cluster heads"""
+        now = time.time()
+        with self._lock:
+            for zone, vec, doc_id, risk_analysis in zip(zones, vecs, doc_ids, risk_analyses):
+                if zone is None:
+                    continue
+                index, order = self._zone(zone, vecs.shape[1])
+                entry_id = self._next_id
+                self._next_id += 1
+                index.add_with_ids(vec.reshape(1, -1), np.array([entry_id], dtype=np.int64))
+                order.append((entry_id, now))
+                self._entries[entry_id] = (doc_id, dict(risk_analysis))
+                self._evict(zone)
+
+    def discard(self, doc_ids: List[str]):
+        """Forget heads whose documents were never written or have been resolved"""
+        doc_ids = set(doc_ids)
+        if not doc_ids:
+            return
+        with self._lock:
+            dead = {i for i, (doc_id, _) in self._entries.items() if doc_id in doc_ids}
+            for zone, (index, order) in self._zones.items():
+                kept = deque(e for e in order if e[0] not in dead)
+                if len(kept) != len(order):
+                    index.remove_ids(np.array([e[0] for e in order if e[0] in dead], dtype=np.int64))
+                    self._zones[zone] = (index, kept)
+            for i in dead:
+                del self._entries[i]
+
+    def stats(self) -> dict:
+        duplicates = self.index_duplicates + self.batch_duplicates
+        return {
+            "zones": len(self._zones),
+            "indexed": len(self._entries),
+            "threshold": self.threshold,
+            "checked": self.checked,
+            "duplicates": duplicates,
+            "index_duplicates": self.index_duplicates,
+            "batch_duplicates": self.batch_duplicates,
+            "evicted": self.evicted,
+            "duplicate_rate": round(duplicates / self.checked, 4) if self.checked else 0.0,
+        }
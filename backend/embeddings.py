@@ -0,0 +1,209 @@
+"""
+MiniLM sentence embeddings behind one interface, shared by the risk
+service (backend/) and RAG (backend-ai/, via sys.path).
+
+    EMBEDDING_BACKEND=torch   SentenceTransformer on PyTorch (default)
+    EMBEDDING_BACKEND=onnx    ONNX Runtime export, fp32 or int8
+
+Both expose encode(texts, batch_size=..., convert_to_numpy=True) and
+get_sentence_embedding_dimension(), like SentenceTransformer. The ONNX
+path tokenizes with the Rust `tokenizers` library, sorts each call's
+texts by length and pads every batch only to its own longest text, then
+mean-pools and L2-normalizes exactly like the sentence-transformers
+pipeline.
+
+Export once (checks cosine parity against the torch model):
+    python embeddings.py export --out onnx/all-MiniLM-L6-v2 --quantize
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+HF_MODEL_ID = "sentence-transformers/" + EMBEDDING_MODEL
+MAX_SEQ_LENGTH = 256  # sentence-transformers' setting for this model
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx", EMBEDDING_MODEL),
+)
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "1") == "1"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+# Minimum cosine to the torch embedding for an export to be accepted
+PARITY_TOLERANCE = {"fp32": 0.9999, "int8": 0.99}
+PARITY_SENTENCES = [
+    "Garbage has not been collected in Zone 3 for two weeks and the smell is unbearable.",
+    "The main water pipeline is leaking and the road is flooded every morning.",
+    "Street lights have been non functional for a month causing accidents at night.",
+    "Large potholes on the highway are causing damage to vehicles and injuries.",
+    "Sewage is overflowing into the residential lanes near the primary school.",
+    "Stray dogs near the market.",
+]
+
+
+def embedding_version(backend: str = EMBEDDING_BACKEND, quantized: bool = ONNX_QUANTIZED) -> str:
+    """
+    Cache-key suffix: each backend's vectors are only near-identical. Key
+    caches on the loaded embedder's .version, which is this for the backend
+    it actually uses (load_embedder may fall back to torch).
+    """
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL}:onnx-{'int8' if quantized else 'fp32'}"
+    return EMBEDDING_MODEL
+
+
+class TorchEmbedder:
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(EMBEDDING_MODEL)
+        self.version = embedding_version("torch")
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class OnnxEmbedder:
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()  # padded per batch in encode()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+        self.version = embedding_version("onnx", quantized)
+
+    def _run(self, encodings) -> np.ndarray:
+        width = max(len(e.ids) for e in encodings)
+        ids = np.zeros((len(encodings), width), dtype=np.int64)
+        mask = np.zeros_like(ids)
+        for row, e in enumerate(encodings):
+            ids[row, :len(e.ids)] = e.ids
+            mask[row, :len(e.ids)] = 1
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+
+        tokens = self.session.run(None, feeds)[0]
+        # Mean pooling over real tokens, then L2 normalization
+        m = mask[:, :, None].astype(np.float32)
+        pooled = (tokens * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not len(texts):
+            return out
+        encodings = self.tokenizer.encode_batch(list(texts))
+        # Similar lengths together, so little padding is computed
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            out[idx] = self._run([encodings[i] for i in idx])
+        return out
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+def load_embedder(backend: str = EMBEDDING_BACKEND):
+    if backend == "onnx":
+        model_file = "model.int8.onnx" if ONNX_QUANTIZED else "model.onnx"
+        if os.path.exists(os.path.join(ONNX_MODEL_DIR, model_file)):
+            logger.info(f"Embeddings: ONNX Runtime ({model_file})")
+            return OnnxEmbedder()
+        logger.warning(
+            f"No ONNX export at {ONNX_MODEL_DIR}; using the torch embedder. "
+            "Run `python embeddings.py export --quantize` to create it."
+        )
+    elif backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    return TorchEmbedder()
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices"""
+    a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    b = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+# ---------------- EXPORT ----------------
+def export_onnx(out_dir: str, quantize: bool):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    model = AutoModel.from_pretrained(HF_MODEL_ID).eval()
+    tokenizer.save_pretrained(out_dir)  # writes tokenizer.json for the fast tokenizer
+
+    sample = tokenizer(PARITY_SENTENCES[:2], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), os.path.join(out_dir, "model.onnx"),
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic, opset_version=14,
+        )
+    variants = ["fp32"]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            os.path.join(out_dir, "model.onnx"), os.path.join(out_dir, "model.int8.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+        variants.append("int8")
+
+    reference = TorchEmbedder().encode(PARITY_SENTENCES)
+    manifest = {"model": HF_MODEL_ID, "max_seq_length": MAX_SEQ_LENGTH, "parity": {}}
+    for variant in variants:
+        onnx_emb = OnnxEmbedder(out_dir, quantized=variant == "int8").encode(PARITY_SENTENCES)
+        worst = float(cosine_parity(reference, onnx_emb).min())
+        manifest["parity"][variant] = worst
+        status = "ok" if worst >= PARITY_TOLERANCE[variant] else "FAILED"
+        print(f"{variant}: min cosine to torch {worst:.5f} (>= {PARITY_TOLERANCE[variant]}) {status}")
+        if worst < PARITY_TOLERANCE[variant]:
+            sys.exit(f"{variant} export is outside the parity tolerance")
+
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Exported to {out_dir}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export")
+    exp.add_argument("--out", default=ONNX_MODEL_DIR)
+    exp.add_argument("--quantize", action="store_true")
+    args = ap.parse_args()
+    export_onnx(args.out, args.quantize)
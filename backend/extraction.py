@@ -0,0 +1,225 @@
+import re
+from datetime import datetime
+from typing import List, Optional
+
+# ---------------- PATTERNS (compiled once) ----------------
+WHITESPACE = re.compile(r"\s+")
+
+SUBJECT_FIELD = re.compile(r"(?i)^subject[\s:\-]+(.+)")
+SENDER_FIELD = re.compile(r"(?i)^sender[\s:\-]+(.+)")
+SENDER_KEYWORDS = [
+    "committee", "association", "residents",
+    "society", "citizens", "welfare"
+]
+
+# Header / metadata lines that never belong to the complaint body
+BODY_DROP = re.compile(
+    r"(?i)^(subject|to|from|date|location|sender|address)\s*[:\-]"
+)
+SIGN_OFF = re.compile(r"(?i)(yours sincerely|yours faithfully|with regards|thank you)")
+VERB_LIKE = re.compile(r"\b(is|are|has|have|was|were|remain|causing|resulting)\b", re.I)
+
+# Order matters: the first pattern that matches anywhere wins
+DATE_PATTERNS = [
+    re.compile(p, re.I) for p in [
+        r"\b\d{1,2}\s*(January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{4}\b",
+        r"\b\d{1,2}\s*(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\s*\d{4}\b",
+        r"\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b",
+        r"\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b",
+    ]
+]
+DATE_FORMATS = [
+    "%d %B %Y", "%d %b %Y",
+    "%d-%m-%Y", "%d/%m/%Y",
+    "%Y-%m-%d"
+]
+
+ZONE_PATTERNS = [
+    re.compile(r"\bzone\s*[-:]?\s*\d+\b", re.I),   # Zone 3, Zone-3
+    re.compile(r"\bz\s*o\s*n\s*e\s*\d+\b", re.I),  # Z O N E 3 (OCR spaced)
+]
+
+SENTENCE_SPLIT = re.compile(r"[.!?]")
+
+PEOPLE_WORDS = [
+    "people", "residents", "citizens",
+    "individuals", "families", "households", "population"
+]
+_PEOPLE = "|".join(PEOPLE_WORDS)
+
+POPULATION_EXPLICIT = re.compile(
+    r"(affecting|affected|impacting)\s+(approximately\s+)?([\d,]+)\s+"
+    r"(people|residents|citizens|individuals|families|households)"
+)
+# (pattern, population) checked in order after the explicit number
+POPULATION_SCALES = [
+    (re.compile(r"(thousands of|large number of|numerous)\s+(" + _PEOPLE + r")"), 10000),
+    (re.compile(r"(many|several|multiple|large group of)\s+(" + _PEOPLE + r")"), 3000),
+    (re.compile(r"(few|some|limited number of|nearby)\s+(" + _PEOPLE + r")"), 800),
+]
+
+
+# ---------------- LINE HELPERS ----------------
+def split_lines(raw_text: str) -> List[str]:
+    return [l.strip() for l in raw_text.splitlines() if l.strip()]
+
+# Outcomes of looking at one line for the complaint body
+_KEEP, _DROP, _STOP = 0, 1, 2
+
+def _body_line(line: str) -> int:
+    if BODY_DROP.match(line):
+        return _DROP
+
+    if SIGN_OFF.search(line):
+        return _STOP  # footer starts → stop reading
+
+    # Drop address / designation-heavy lines
+    # Heuristic: many commas + mostly title case
+    if line.count(",") >= 2:
+        words = line.split()
+        if sum(w.istitle() for w in words) / max(1, len(words)) > 0.6:
+            return _DROP
+
+    # Drop very short lines (headers, names)
+    if len(line) < 30:
+        return _DROP
+
+    # Must contain at least one verb-like word, unless long enough
+    # (OCR / formal phrasing)
+    if len(line) < 60 and not VERB_LIKE.search(line):
+        return _DROP
+
+    return _KEEP
+
+def _subject_from_lines(lines: List[str]) -> Optional[str]:
+    # Case 1: Explicit "Subject" with or without colon
+    for l in lines[:5]:
+        m = SUBJECT_FIELD.match(l)
+        if m:
+            return m.group(1).strip()
+
+    # Case 2: First short line heuristic (gov style)
+    first = lines[0] if lines else ""
+    if 5 < len(first) < 120:
+        return first
+
+    return None
+
+def _sender_from_lines(lines: List[str]) -> str:
+    # Case 1: Explicit Sender (with or without colon), last one wins
+    for l in reversed(lines):
+        m = SENDER_FIELD.match(l)
+        if m:
+            return m.group(1).strip()
+
+    # Case 2: Organization-style ending line
+    for l in reversed(lines[-5:]):
+        low = l.lower()
+        if any(k in low for k in SENDER_KEYWORDS):
+            return l
+
+    return "Anonymous"
+
+def _body_from_lines(lines: List[str]) -> str:
+    complaint_lines = []
+    for line in lines:
+        outcome = _body_line(line)
+        if outcome == _STOP:
+            break
+        if outcome == _KEEP:
+            complaint_lines.append(line)
+    return WHITESPACE.sub(" ", " ".join(complaint_lines)).strip()
+
+
+# ---------------- FIELD EXTRACTORS ----------------
+def clean_text(t: str) -> str:
+    return WHITESPACE.sub(" ", t).strip()
+
+def extract_subject(raw_text: str) -> Optional[str]:
+    return _subject_from_lines(split_lines(raw_text))
+
+def extract_sender(raw_text: str) -> str:
+    return _sender_from_lines(split_lines(raw_text))
+
+def _date_from_flat(t: str) -> str:
+    for p in DATE_PATTERNS:
+        m = p.search(t)
+        if m:
+            raw = m.group(0)
+            for fmt in DATE_FORMATS:
+                try:
+                    return datetime.strptime(raw, fmt).strftime("%Y-%m-%d")
+                except ValueError:
+                    pass
+            return raw
+    return "Not mentioned"
+
+def extract_date(text: str) -> str:
+    return _date_from_flat(WHITESPACE.sub(" ", text))
+
+def _zone_from_flat(t: str) -> Optional[str]:
+    for p in ZONE_PATTERNS:
+        m = p.search(t)
+        if m:
+            return m.group(0).replace(" ", "").title().replace("-", " ")
+    return None
+
+def extract_zone(text: str) -> Optional[str]:
+    """Explicit "Zone N" mention, without the NER fallback"""
+    return _zone_from_flat(WHITESPACE.sub(" ", text))
+
+def extract_body(raw_text: str) -> str:
+    return _body_from_lines(split_lines(raw_text))
+
+def extract_complaint(body_text: str) -> str:
+    if len(body_text) < 50:
+        return ""
+
+    sentences = [
+        s.strip()
+        for s in SENTENCE_SPLIT.split(body_text)
+        if len(s.strip()) > 20
+    ]
+
+    return ". ".join(sentences[:4])
+
+# ---------------- POPULATION LOGIC ----------------
+def resolve_population(text: str) -> int:
+    t = text.lower()
+
+    # 1️⃣ Explicit numeric population
+    m = POPULATION_EXPLICIT.search(t)
+    if m:
+        return int(m.group(3).replace(",", ""))
+
+    # 2️⃣-4️⃣ Large / medium / small impact wording
+    for pattern, population in POPULATION_SCALES:
+        if pattern.search(t):
+            return population
+
+    # 5️⃣ No signal → local
+    return 500
+
+
+# ---------------- SINGLE PASS ----------------
+def extract_fields(raw_text: str) -> dict:
+    """
+    All text fields of a document from one tokenization: the text is split
+    into lines and whitespace-normalized once, and every extractor works
+    on those. Returns subject, sender, date, zone (None when NER is
+    needed), body, complaint and population, with the same values as the
+    individual extractors.
+    """
+    lines = split_lines(raw_text)
+    flat = WHITESPACE.sub(" ", raw_text)
+    body = _body_from_lines(lines)
+
+    return {
+        "subject": _subject_from_lines(lines),
+        "sender": _sender_from_lines(lines),
+        "date": _date_from_flat(flat),
+        "zone": _zone_from_flat(flat),
+        "body": body,
+        "complaint": extract_complaint(body),
+        "population": resolve_population(body),
+    }
@@ -0,0 +1,281 @@
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+# ---------------- IN-MEMORY FIRESTORE (offline / tests) ----------------
+class _FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[dict]):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _FakeDocument:
+    def __init__(self, store: "InMemoryFirestore", collection: str, doc_id: str):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data: dict, merge: bool = False):
+        self._store._write(self._collection, self.id, data, merge=merge)
+
+    def update(self, data: dict):
+        if self.id not in self._store._docs(self._collection):
+            raise KeyError(f"No document to update: {self._collection}/{self.id}")
+        self._store._write(self._collection, self.id, data, merge=True)
+
+    def get(self):
+        return _FakeSnapshot(self.id, self._store._docs(self._collection).get(self.id))
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class _FakeQuery:
+    """where / order_by / start_after / limit / select, evaluated on stream()"""
+
+    def __init__(self, store: "InMemoryFirestore", name: str, filters=(), orders=(),
+                 cursor=None, limit_count=None, fields=None):
+        self._store = store
+        self._name = name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._cursor = cursor
+        self._limit = limit_count
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, cursor=self._cursor,
+                     limit_count=self._limit, fields=self._fields)
+        state.update(changes)
+        return _FakeQuery(self._store, self._name, **state)
+
+    def where(self, field: str, op: str, value):
+        return self._copy(filters=self._filters + ((field, _OPS[op], value),))
+
+    def order_by(self, field: str, direction: str = "ASCENDING"):
+        return self._copy(orders=self._orders + ((field, direction == "DESCENDING"),))
+
+    def start_after(self, values):
+        """A snapshot, a {field: value} dict, or values in order_by order"""
+        if isinstance(values, _FakeSnapshot):
+            values = {"__name__": values.id, **values.to_dict()}
+        if isinstance(values, dict):
+            values = [values.get(field) for field, _ in self._orders]
+        return self._copy(cursor=list(values))
+
+    def limit(self, count: int):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    @staticmethod
+    def _value(doc_id: str, data: dict, field: str):
+        return doc_id if field == "__name__" else data.get(field)
+
+    def _after_cursor(self, doc_id: str, data: dict) -> bool:
+        for (field, desc), bound in zip(self._orders, self._cursor):
+            # Cursor values for the document id may be references
+            bound = getattr(bound, "id", bound) if field == "__name__" else bound
+            value = self._value(doc_id, data, field)
+            if value == bound:
+                continue
+            return (value < bound) if desc else (value > bound)
+        return False
+
+    def stream(self):
+        with self._store._lock:
+            docs = list(self._store._docs(self._name).items())
+
+        docs = [
+            (doc_id, data) for doc_id, data in docs
+            if all(field in data and op(data[field], value) for field, op, value in self._filters)
+        ]
+        # Firestore drops documents missing an order_by field
+        docs = [
+            (doc_id, data) for doc_id, data in docs
+            if all(field == "__name__" or field in data for field, _ in self._orders)
+        ]
+        for field, desc in reversed(self._orders):
+            docs.sort(key=lambda d: self._value(d[0], d[1], field), reverse=desc)
+        if self._cursor is not None:
+            docs = [d for d in docs if self._after_cursor(*d)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+
+        for doc_id, data in docs:
+            if self._fields is not None:
+                data = {k: data[k] for k in self._fields if k in data}
+            yield _FakeSnapshot(doc_id, data)
+
+
+class _FakeCollection(_FakeQuery):
+    def __init__(self, store: "InMemoryFirestore", name: str):
+        super().__init__(store, name)
+
+    def document(self, doc_id: Optional[str] = None):
+        return _FakeDocument(self._store, self._name, doc_id or str(uuid.uuid4()))
+
+
+class _FakeBatch:
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._ops = []
+
+    def set(self, ref: _FakeDocument, data: dict, merge: bool = False):
+        self._ops.append((ref, data, merge))
+
+    def update(self, ref: _FakeDocument, data: dict):
+        self._ops.append((ref, data, True))
+
+    def commit(self):
+        if self._store.fail_next_commits > 0:
+            self._store.fail_next_commits -= 1
+            raise RuntimeError("Simulated Firestore commit failure")
+        with self._store._lock:
+            for ref, data, merge in self._ops:
+                ref.set(data, merge=merge)
+        self._ops = []
+
+
+class InMemoryFirestore:
+    """
+    Minimal stand-in for firestore.Client used when FIRESTORE_BACKEND=memory.
+    Supports the calls this service makes: collection/document/set/update/get,
+    queries (where/order_by/start_after/limit/select/stream) and batch().
+    Set `fail_next_commits` to simulate commit errors.
+    """
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.RLock()
+        self.fail_next_commits = 0
+
+    def _docs(self, collection: str) -> dict:
+        return self._collections.setdefault(collection, {})
+
+    @classmethod
+    def _apply(cls, old: dict, data: dict, now: datetime) -> dict:
+        """
+        Merge data into old the way the server would: SERVER_TIMESTAMP and
+        Increment sentinels are resolved, nested maps are merged.
+        """
+        out = dict(old)
+        for k, v in data.items():
+            kind = type(v).__name__
+            if kind == "Sentinel":
+                out[k] = now
+            elif kind == "Increment":
+                current = old.get(k)
+                out[k] = (current if isinstance(current, (int, float)) else 0) + v.value
+            elif isinstance(v, dict):
+                out[k] = cls._apply(old.get(k) if isinstance(old.get(k), dict) else {}, v, now)
+            else:
+                out[k] = v
+        return out
+
+    def _write(self, collection: str, doc_id: str, data: dict, merge: bool):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            docs = self._docs(collection)
+            old = docs.get(doc_id, {}) if merge else {}
+            docs[doc_id] = self._apply(old, data, now)
+
+    def collection(self, name: str):
+        return _FakeCollection(self, name)
+
+    def batch(self):
+        return _FakeBatch(self)
+
+
+# ---------------- BULK WRITER ----------------
+class BulkComplaintWriter:
+    """
+    Groups complaint writes into Firestore batches (<= 500 writes each),
+    commits the batches concurrently on a worker pool and retries failed
+    chunks with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        db,
+        collection: str = "complaints",
+        batch_size: int = MAX_BATCH_WRITES,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.db = db
+        self.collection = collection
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firestore-writer")
+
+    def _commit_chunk(self, chunk: List[tuple]) -> Optional[str]:
+        """Commit one chunk, returning None on success or the last error"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                col = self.db.collection(self.collection)
+                for doc_id, data in chunk:
+                    batch.set(col.document(doc_id), data)
+                batch.commit()
+                return None
+            except Exception as e:
+                error = str(e)
+                logger.warning(
+                    f"Firestore batch of {len(chunk)} failed (attempt {attempt + 1}): {e}"
+                )
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+        return error
+
+    def write(self, documents: List[dict], ids: Optional[List[Optional[str]]] = None) -> List[dict]:
+        """
+        Write documents and return one status per document, in order:
+        {"id": ..., "stored": bool, "error": str | None}
+        Documents get a random id unless one is given in `ids`.
+        """
+        ids = ids or [None] * len(documents)
+        items = [(doc_id or str(uuid.uuid4()), d) for doc_id, d in zip(ids, documents)]
+        chunks = [
+            items[i:i + self.batch_size]
+            for i in range(0, len(items), self.batch_size)
+        ]
+
+        errors = list(self._pool.map(self._commit_chunk, chunks))
+
+        statuses = []
+        for chunk, error in zip(chunks, errors):
+            for doc_id, _ in chunk:
+                statuses.append({"id": doc_id, "stored": error is None, "error": error})
+        return statuses
+
+    def close(self):
+        self._pool.shutdown(wait=True)
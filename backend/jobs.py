@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- JOB STORE ----------------
+class JobStore:
+    """
+    Job and per-file progress for the /jobs API, kept in SQLite.
+
+    path=":memory:" keeps everything in-process (local runs, one worker);
+    a file path lets every uvicorn worker process answer GET /jobs/{id}
+    for jobs that another worker is running. The connection is opened on
+    first use in each process, so a store created before a fork (gunicorn
+    --preload) is never shared by the workers.
+    """
+
+    def __init__(self, path: str = ":memory:", ttl: Optional[float] = 86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs "
+                "(id TEXT PRIMARY KEY, created REAL, updated REAL, total INTEGER);"
+                "CREATE TABLE IF NOT EXISTS job_files "
+                "(job_id TEXT, idx INTEGER, filename TEXT, state TEXT, error TEXT, results TEXT, "
+                "PRIMARY KEY (job_id, idx));"
+            )
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def create(self, filenames: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._db.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job_id, now, now, len(filenames)))
+            self._db.executemany(
+                "INSERT INTO job_files VALUES (?, ?, ?, 'queued', NULL, NULL)",
+                [(job_id, i, name) for i, name in enumerate(filenames)],
+            )
+            self._db.commit()
+        return job_id
+
+    def _purge(self, now: float):
+        if self.ttl is None:
+            return
+        old = [r[0] for r in self._db.execute("SELECT id FROM jobs WHERE updated < ?", (now - self.ttl,))]
+        for job_id in old:
+            self._db.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def _update(self, files: List[tuple], **fields):
+        """Set `fields` on each (job_id, idx) file, in one commit"""
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                f"UPDATE job_files SET {cols} WHERE job_id = ? AND idx = ?",
+                [(*fields.values(), job_id, idx) for job_id, idx in files],
+            )
+            self._db.executemany(
+                "UPDATE jobs SET updated = ? WHERE id = ?",
+                [(now, job_id) for job_id in {job_id for job_id, _ in files}],
+            )
+            self._db.commit()
+
+    def set_state(self, job_id: str, idx: int, state: str):
+        self._update([(job_id, idx)], state=state)
+
+    def set_states(self, files: List[tuple], state: str):
+        self._update(files, state=state)
+
+    def fail(self, job_id: str, idx: int, error: str):
+        self._update([(job_id, idx)], state="failed", error=error)
+
+    def fail_many(self, files: List[tuple], error: str):
+        self._update(files, state="failed", error=error)
+
+    def finish(self, job_id: str, idx: int, results: list):
+        self._update([(job_id, idx)], state="done", results=json.dumps(results, default=str))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._db.execute("SELECT created, updated, total FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = self._db.execute(
+                "SELECT filename, state, error, results FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+
+        files, results = [], []
+        for filename, state, error, blob in rows:
+            file_results = json.loads(blob) if blob else []
+            results.extend(file_results)
+            files.append({"filename": filename, "state": state, "error": error, "complaints": len(file_results)})
+
+        finished = sum(f["state"] in ("done", "failed") for f in files)
+        failed = sum(f["state"] == "failed" for f in files)
+        if finished < len(files):
+            status = "queued" if all(f["state"] == "queued" for f in files) else "running"
+        elif failed == len(files):
+            status = "failed"
+        else:
+            status = "completed_with_errors" if failed else "completed"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "progress": {"files_total": job[2], "files_finished": finished, "files_failed": failed},
+            "created_at": job[0],
+            "updated_at": job[1],
+            "files": files,
+            "results": results,
+        }
+
+
+# ---------------- PIPELINE ----------------
+class JobPipeline:
+    """
+    Staged worker pipeline for uploaded files:
+
+        parse -> extract -> score -> persist
+
+    Stages after parsing are connected by bounded asyncio queues, so a slow
+    stage applies backpressure instead of letting parsed documents pile up
+    in memory (the parse queue only holds uploads spilled to temp files).
+    Parsing runs `parse_workers` files at a time on the ParsePool's
+    processes; extract/score/persist run in the threadpool, and the score
+    and persist stages take whatever is queued (up to `batch_files` files)
+    in one batched call. A file that fails in any stage is marked failed
+    with its error; the rest of the job carries on. Store writes (SQLite
+    commits) run in the threadpool, never on the event loop. stop() fails
+    every file that has not finished and removes the spilled uploads still
+    queued for parsing.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        parse: Callable[[str, str], Awaitable[tuple]],
+        extract: Callable[[str, object, bool, Optional[dict]], list],
+        score: Callable[[list], list],
+        persist: Callable[[list], list],
+        parse_workers: int = 4,
+        queue_size: int = 16,
+        batch_files: int = 32,
+    ):
+        self.store = store
+        self.parse = parse
+        self.extract = extract
+        self.score = score
+        self.persist = persist
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.batch_files = batch_files
+        self._queues = {}
+        self._tasks = []
+        self._pending = {}  # (job_id, idx) -> filename, until done or failed
+
+    async def start(self):
+        self._queues = {"parse": asyncio.Queue()}
+        for name in ("extract", "score", "persist"):
+            self._queues[name] = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._parse_worker()) for _ in range(self.parse_workers)]
+        self._tasks += [
+            asyncio.create_task(self._extract_worker()),
+            asyncio.create_task(self._batch_worker("score", "scoring", self._score_batch)),
+            asyncio.create_task(self._batch_worker("persist", "persisting", self._persist_batch)),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Cancelled workers close the upload they were parsing; the ones
+        # still queued are closed here
+        for name, queue in self._queues.items():
+            while not queue.empty():
+                item = queue.get_nowait()
+                if name == "parse":
+                    item[3].close()
+        unfinished, self._pending = list(self._pending), {}
+        if unfinished:
+            logger.warning(f"Job pipeline stopped with {len(unfinished)} unfinished files")
+            await run_in_threadpool(
+                self.store.fail_many, unfinished, "Server shut down before the file was processed"
+            )
+
+    async def submit(self, job_id: str, uploads: List[tuple]):
+        """Queue (filename, BufferedUpload) pairs of a job created in the store"""
+        for idx, (filename, upload) in enumerate(uploads):
+            self._pending[(job_id, idx)] = filename
+            await self._queues["parse"].put((job_id, idx, filename, upload))
+
+    async def _fail(self, job_id: str, idx: int, filename: str, e: Exception):
+        error = getattr(e, "detail", None) or str(e) or type(e).__name__
+        logger.warning(f"Job {job_id}: {filename} failed: {error}")
+        self._pending.pop((job_id, idx), None)
+        await run_in_threadpool(self.store.fail, job_id, idx, error)
+
+    async def _parse_worker(self):
+        while True:
+            job_id, idx, filename, upload = await self._queues["parse"].get()
+            try:
+                await run_in_threadpool(self.store.set_state, job_id, idx, "parsing")
+                parsed = await self.parse(upload.source, filename)
+            except Exception as e:
+                await self._fail(job_id, idx, filename, e)
+                continue
+            finally:
+                upload.close()
+            await self._queues["extract"].put((job_id, idx, filename, parsed))
+
+    async def _extract_worker(self):
+        while True:
+            job_id, idx, filename, parsed = await self._queues["extract"].get()
+            try:
+                await run_in_threadpool(self.store.set_state, job_id, idx, "extracting")
+                results = await run_in_threadpool(self.extract, filename, *parsed)
+            except Exception as e:
+                await self._fail(job_id, idx, filename, e)
+                continue
+            await self._queues["score"].put((job_id, idx, filename, results))
+
+    async def _batch_worker(self, stage: str, state: str, handle):
+        queue = self._queues[stage]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_files and not queue.empty():
+                batch.append(queue.get_nowait())
+            await run_in_threadpool(self.store.set_states, [(job_id, idx) for job_id, idx, _, _ in batch], state)
+            await handle(batch)
+
+    async def _score_batch(self, batch: list):
+        try:
+            await run_in_threadpool(self.score, [r for *_, results in batch for r in results])
+        except Exception:
+            # Score files one by one so a bad one only fails itself
+            for item in batch:
+                try:
+                    await run_in_threadpool(self.score, item[3])
+                except Exception as e:
+                    await self._fail(item[0], item[1], item[2], e)
+                    continue
+                await self._queues["persist"].put(item)
+            return
+        for item in batch:
+            await self._queues["persist"].put(item)
+
+    async def _persist_batch(self, batch: list):
+        try:
+            await run_in_threadpool(self.persist, [r for *_, results in batch for r in results])
+        except Exception as e:
+            for job_id, idx, filename, _ in batch:
+                await self._fail(job_id, idx, filename, e)
+            return
+        await run_in_threadpool(self._finish_batch, batch)
+        for job_id, idx, _, _ in batch:
+            self._pending.pop((job_id, idx), None)
+
+    def _finish_batch(self, batch: list):
+        for job_id, idx, _, results in batch:
+            self.store.finish(job_id, idx, results)
@@ -0,0 +1,55 @@
+import logging
+from typing import List, Optional
+
+from extraction import WHITESPACE, extract_zone
+
+logger = logging.getLogger(__name__)
+
+
+class LocationResolver:
+    """
+    Resolves complaint locations in bulk: explicit "Zone N" mentions first,
+    then spaCy NER for the rest. The NER texts go through nlp.pipe in
+    batches with every component except "ner" disabled, so the tagger,
+    parser and lemmatizer are not run for nothing.
+    """
+
+    def __init__(self, nlp, batch_size: int = 64, n_process: int = 1):
+        self.nlp = nlp
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    def _first_gpe(self, doc) -> Optional[str]:
+        for ent in doc.ents:
+            if ent.label_ == "GPE":
+                return ent.text
+        return None
+
+    def resolve(self, texts: List[str]) -> List[Optional[str]]:
+        locations = [extract_zone(t) for t in texts]
+        pending = [i for i, loc in enumerate(locations) if loc is None]
+        if not pending:
+            return locations
+
+        try:
+            docs = self.nlp.pipe(
+                (WHITESPACE.sub(" ", texts[i]) for i in pending),
+                batch_size=self.batch_size,
+                n_process=self.n_process,
+                disable=[name for name in self.nlp.pipe_names if name != "ner"],
+            )
+            for i, doc in zip(pending, docs):
+                locations[i] = self._first_gpe(doc)
+        except Exception as e:
+            # Same as before: NER failures leave the location empty
+            logger.warning(f"NER location lookup failed: {e}")
+
+        return locations
+
+    def fill(self, pending: List[tuple]):
+        """Set result["extracted"]["location"] for (result, text) pairs"""
+        if not pending:
+            return
+        locations = self.resolve([text for _, text in pending])
+        for (result, _), location in zip(pending, locations):
+            result["extracted"]["location"] = location
@@ -0,0 +1,166 @@
+"""
+Lazily loaded models and clients for the risk service.
+
+Nothing heavy is imported or loaded at import time: each entry is built
+by its loader on first use (thread-safe, once per process). A worker can
+therefore serve Firestore-only endpoints such as /admin/complaints before,
+or without, the ML stack.
+
+Preloading before fork (copy-on-write sharing of model pages):
+    PRELOAD_MODELS=all gunicorn risk:app -k uvicorn.workers.UvicornWorker \\
+        --workers 4 --preload
+gunicorn imports the app once in the master, the models are loaded there,
+and the forked workers share those pages until they write to them.
+(`uvicorn --workers` spawns fresh interpreters, so nothing is shared.)
+The Firestore client is never preloaded: gRPC channels must not cross a
+fork, so each worker connects on first use.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from embeddings import load_embedder
+
+logger = logging.getLogger(__name__)
+
+# EMBEDDING_BACKEND picks torch or ONNX Runtime (see embeddings.py); the
+# loaded embedder's .version names the backend it really uses in cache keys
+RISK_MODEL_PATH = "risk_model.json"
+SCALER_PATH = "feature_scaler.pkl"
+SPACY_MODEL = "en_core_web_sm"
+RISK_THREADS = int(os.getenv("RISK_THREADS", "0"))  # large batches; 0 = all cores
+
+
+# Models /ready waits for; the Firestore client is checked separately.
+# risk_model/scaler are the sklearn-wrapper reference for risk_scorer and
+# are only loaded on demand (bench_risk_model.py).
+ML_MODELS = ("risk_scorer", "embedder", "nlp")
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders: Dict[str, Callable] = {}
+        self._models = {}
+        self._errors = {}
+        self._load_seconds = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                t0 = time.perf_counter()
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._errors.pop(name, None)
+                self._load_seconds[name] = round(time.perf_counter() - t0, 3)
+                logger.info(f"Loaded {name} in {self._load_seconds[name]:.1f}s")
+            return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def preload(self, names: Optional[List[str]] = None):
+        for name in names or ML_MODELS:
+            self.get(name)
+
+    def proxy(self, name: str) -> "LazyModel":
+        return LazyModel(self, name)
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._loaders
+        }
+
+
+class LazyModel:
+    """Stand-in that loads the registry entry on first attribute access or call"""
+
+    def __init__(self, registry: ModelRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+
+# ---------------- LOADERS ----------------
+def load_risk_model():
+    import xgboost as xgb
+    model = xgb.XGBRegressor()
+    model.load_model(RISK_MODEL_PATH)
+    return model
+
+
+def load_scaler():
+    import joblib
+    return joblib.load(SCALER_PATH)
+
+
+def load_risk_scorer():
+    from risk_scorer import RiskScorer
+    return RiskScorer(RISK_MODEL_PATH, SCALER_PATH, threads=RISK_THREADS)
+
+
+def load_nlp():
+    import spacy
+    return spacy.load(SPACY_MODEL)
+
+
+def load_firestore():
+    # "firebase" (default) or "memory" for offline runs. The Firestore emulator is
+    # picked up by the client automatically when FIRESTORE_EMULATOR_HOST is set.
+    if os.getenv("FIRESTORE_BACKEND", "firebase") == "memory":
+        from firestore_writer import InMemoryFirestore
+        return InMemoryFirestore()
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    cred_info = json.loads(os.getenv("FIREBASE_CREDS"))
+    if "private_key" in cred_info:
+        cred_info["private_key"] = cred_info["private_key"].replace("\\n", "\n")
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(cred_info))
+    return firestore.client()
+
+
+registry = ModelRegistry()
+registry.register("risk_model", load_risk_model)
+registry.register("scaler", load_scaler)
+registry.register("risk_scorer", load_risk_scorer)
+registry.register("embedder", load_embedder)
+registry.register("nlp", load_nlp)
+registry.register("firestore", load_firestore)
+
+
+def preload_from_env():
+    """PRELOAD_MODELS=all or a comma-separated subset of ML_MODELS"""
+    wanted = os.getenv("PRELOAD_MODELS", "").strip()
+    if not wanted:
+        return
+    names = list(ML_MODELS) if wanted == "all" else [n.strip() for n in wanted.split(",") if n.strip()]
+    t0 = time.perf_counter()
+    registry.preload([n for n in names if n != "firestore"])
+    logger.info(f"Preloaded {', '.join(names)} in {time.perf_counter() - t0:.1f}s")
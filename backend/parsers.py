@@ -0,0 +1,343 @@
+import io
+import os
+import math
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Union
+
+from fastapi import HTTPException
+import fitz  # PyMuPDF
+from docx import Document
+
+# OCR (PDF only); pages are rendered by PyMuPDF, no poppler needed
+import pytesseract
+from PIL import Image
+import pandas as pd
+from openpyxl import load_workbook
+
+from extraction import SIGN_OFF, extract_fields
+
+# Kept free of model imports on purpose: worker processes import this module
+# (and the regex-only extraction module) and nothing else, so they start fast
+# and stay small.
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".csv", ".xls", ".xlsx"}
+OCR_DPI = 300               # upper bound: never render finer than this
+OCR_MIN_DPI = 150
+OCR_MAX_PIXELS = 9_000_000  # A4 at 300 DPI is ~8.7M
+PAGE_TEXT_MIN_CHARS = 20    # less text than this on a page with an image -> scanned
+
+# An upload as the parsers take it: the file's bytes, or a path on disk
+# (see uploads.BufferedUpload)
+Source = Union[bytes, str]
+
+def as_file(source: Source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def open_pdf(source: Source) -> fitz.Document:
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def unsupported_file_error() -> HTTPException:
+    return HTTPException(
+        status_code=422,
+        detail="Unsupported file type. Upload PDF, DOCX, CSV, XLS or XLSX only."
+    )
+
+# ---------------- PDF ----------------
+# A PDF is handled page by page: pages with a text layer are read directly,
+# pages that are only an image are OCR'd, blank pages are ignored. Each page
+# is a dict {"page", "source": text|ocr|blank|skipped, "text", "dpi", "ms",
+# "error"}; page_report() summarizes them for the API response.
+
+def ocr_dpi(page) -> int:
+    """
+    Render at the resolution of the page's scan (no point upsampling a 150
+    DPI scan to 300), between OCR_MIN_DPI and OCR_DPI, and within
+    OCR_MAX_PIXELS for oversized pages.
+    """
+    dpi = OCR_DPI
+    images = [i for i in page.get_image_info() if i["bbox"][2] > i["bbox"][0]]
+    if images:
+        img = max(images, key=lambda i: (i["bbox"][2] - i["bbox"][0]) * (i["bbox"][3] - i["bbox"][1]))
+        native = img["width"] / ((img["bbox"][2] - img["bbox"][0]) / 72)
+        dpi = min(OCR_DPI, max(OCR_MIN_DPI, native))
+    area_in = (page.rect.width / 72) * (page.rect.height / 72)
+    return int(min(dpi, math.sqrt(OCR_MAX_PIXELS / max(area_in, 1e-6))))
+
+def pdf_text_layer(source: Source) -> List[dict]:
+    """Text layer of every page, and the OCR DPI of pages that need OCR"""
+    pages = []
+    with open_pdf(source) as pdf:
+        for n, page in enumerate(pdf, start=1):
+            t0 = time.perf_counter()
+            text = page.get_text()
+            entry = {"page": n, "source": "text", "text": text, "dpi": None, "ms": 0.0, "error": None}
+            if len(text.strip()) < PAGE_TEXT_MIN_CHARS:
+                if page.get_images():
+                    entry.update(source="ocr", dpi=ocr_dpi(page))
+                elif not text.strip():
+                    entry["source"] = "blank"
+            entry["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            pages.append(entry)
+    return pages
+
+def ocr_pdf_page(source: Source, page_no: int, dpi: int = OCR_DPI) -> dict:
+    """OCR a single 1-based page; failures are returned, not raised"""
+    t0 = time.perf_counter()
+    try:
+        with open_pdf(source) as pdf:
+            pix = pdf[page_no - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        text, error = pytesseract.image_to_string(img, lang="eng"), None
+    except Exception as e:
+        text, error = "", f"{type(e).__name__}: {e}"
+    return {"text": text, "ms": round((time.perf_counter() - t0) * 1000, 2), "error": error}
+
+def pdf_text(pages: List[dict]) -> str:
+    # Text-layer pages are joined exactly as before (no separator)
+    return "".join(p["text"] if p["source"] == "text" else p["text"] + "\n" for p in pages).strip()
+
+def fields_complete(pages: List[dict]) -> bool:
+    """
+    True once the complaint, the sign-off and a sender are in the text so
+    far: the letter is over, so the remaining scanned pages (annexures,
+    photos) need no OCR.
+    """
+    text = pdf_text(pages)
+    if not SIGN_OFF.search(text):
+        return False
+    fields = extract_fields(text)
+    return bool(fields["complaint"]) and fields["sender"] != "Anonymous"
+
+def skip_pages(pages: List[dict], start: int):
+    # Only the OCR pages: text-layer pages are already read (a date or zone
+    # in a text annexure still counts)
+    for p in pages[start:]:
+        if p["source"] == "ocr":
+            p.update(source="skipped", text="", dpi=None, ms=0.0)
+
+def page_report(pages: List[dict]) -> dict:
+    return {
+        "pages": len(pages),
+        "ocr_pages": [p["page"] for p in pages if p["source"] == "ocr"],
+        "skipped_pages": [p["page"] for p in pages if p["source"] == "skipped"],
+        "failed_pages": [{"page": p["page"], "error": p["error"]} for p in pages if p["error"]],
+        "timings_ms": [p["ms"] for p in pages],
+    }
+
+def parse_pdf(source: Source) -> tuple[str, bool, dict]:
+    """(text, ocr_used, page report), OCR'ing pages in order until the fields are complete"""
+    pages = pdf_text_layer(source)
+    for i, p in enumerate(pages):
+        if p["source"] != "ocr":
+            continue
+        if fields_complete(pages[:i]):
+            skip_pages(pages, i)
+            break
+        p.update(ocr_pdf_page(source, p["page"], p["dpi"]))
+    report = page_report(pages)
+    return pdf_text(pages), bool(report["ocr_pages"]), report
+
+def parse_docx(source: Source) -> str:
+    doc = Document(as_file(source))
+    text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+    del doc
+    return text.strip()
+
+STRUCTURED_FIELDS = ["subject", "complaint", "location", "date", "sender"]
+
+def parse_structured(df: pd.DataFrame) -> List[dict]:
+    # Column-wise instead of iterrows; str() per cell keeps the old output
+    # (including "nan" for empty cells)
+    columns = [
+        df[c].map(str).str.strip().tolist() if c in df.columns else [""] * len(df)
+        for c in STRUCTURED_FIELDS
+    ]
+    return [dict(zip(STRUCTURED_FIELDS, values)) for values in zip(*columns)]
+
+def iter_excel_frames(source: Source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # openpyxl read-only mode streams rows from the sheet XML instead of
+    # building the whole workbook in memory. First sheet, as pd.read_excel
+    # reads: wb.active is whichever sheet was selected when it was saved
+    wb = load_workbook(as_file(source), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+
+        chunk = []
+        for row in rows:
+            chunk.append([float("nan") if v is None else v for v in row])
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        wb.close()
+
+def iter_structured_chunks(source: Source, filename: str, chunk_rows: int = 1000) -> Iterator[List[dict]]:
+    """Yield spreadsheet records `chunk_rows` at a time, never loading the whole file"""
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == ".csv":
+        frames = pd.read_csv(as_file(source), chunksize=chunk_rows)
+    elif ext == ".xlsx":
+        frames = iter_excel_frames(source, chunk_rows)
+    elif ext == ".xls":
+        # xlrd has no streaming reader; load once and hand out slices
+        df = pd.read_excel(as_file(source))
+        frames = (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+    else:
+        raise HTTPException(
+            status_code=422,
+            detail="Streaming ingestion supports CSV, XLS and XLSX only."
+        )
+
+    for frame in frames:
+        yield parse_structured(frame)
+
+def parse_non_pdf(source: Source, filename: str) -> Union[str, list]:
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == ".docx":
+        return parse_docx(source)
+
+    if ext == ".csv":
+        df = pd.read_csv(as_file(source))
+        return parse_structured(df)
+
+    if ext in [".xls", ".xlsx"]:
+        df = pd.read_excel(as_file(source))
+        return parse_structured(df)
+
+    raise unsupported_file_error()
+
+def parse_file(source: Source, filename: str) -> tuple[Union[str, list], bool, Optional[dict]]:
+    """(raw, ocr_used, page report); the report is None for non-PDF files"""
+    if os.path.splitext(filename)[1].lower() == ".pdf":
+        return parse_pdf(source)
+    return parse_non_pdf(source, filename), False, None
+
+
+# ---------------- PARSE POOL ----------------
+class ParsePool:
+    """
+    Runs parsing and OCR on a process pool so the event loop stays free.
+    Several uploads are parsed at once (bounded by max_concurrent_files).
+    The pages of a PDF that need OCR are OCR'd in parallel, max_workers
+    pages at a time in page order, stopping once the fields are complete.
+    Each file gets `timeout` seconds in total, OCR included.
+
+    A worker that dies (OCR running out of memory, a PyMuPDF crash) breaks
+    the whole executor, so the pool is replaced and every interrupted call
+    is retried once in a process of its own: the call that crashes again
+    fails only its own file. A timed-out parse cannot be cancelled inside
+    its worker, so the pool is recycled (workers terminated) to get the
+    capacity back; other files' calls in flight are retried as above.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_concurrent_files: int = 4,
+        timeout: float = 120.0,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._files = asyncio.Semaphore(max_concurrent_files)
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Created lazily; "spawn" keeps workers from inheriting the models
+        # loaded in the parent process.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @staticmethod
+    def _terminate(pool: ProcessPoolExecutor):
+        # Terminating first breaks the executor, so its pending calls fail
+        # with BrokenProcessPool (and are retried) instead of being cancelled
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False)
+
+    def _recycle(self, pool: ProcessPoolExecutor):
+        """Drop `pool` (if still current) and terminate its workers"""
+        if self._pool is pool:
+            self._pool = None
+        self._terminate(pool)
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            self._recycle(pool)
+
+        isolated = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return await loop.run_in_executor(isolated, fn, *args)
+        finally:
+            self._terminate(isolated)
+
+    async def _parse_pdf(self, source: Source) -> tuple[str, bool, dict]:
+        pages = await self._run(pdf_text_layer, source)
+        todo = [i for i, p in enumerate(pages) if p["source"] == "ocr"]
+        while todo:
+            if fields_complete(pages[:todo[0]]):
+                skip_pages(pages, todo[0])
+                break
+            wave, todo = todo[:self.max_workers], todo[self.max_workers:]
+            outs = await asyncio.gather(
+                *(self._run(ocr_pdf_page, source, pages[i]["page"], pages[i]["dpi"]) for i in wave)
+            )
+            for i, out in zip(wave, outs):
+                pages[i].update(out)
+        report = page_report(pages)
+        return pdf_text(pages), bool(report["ocr_pages"]), report
+
+    async def _parse(self, source: Source, filename: str) -> tuple[Union[str, list], bool, Optional[dict]]:
+        if os.path.splitext(filename)[1].lower() == ".pdf":
+            return await self._parse_pdf(source)
+        return await self._run(parse_non_pdf, source, filename), False, None
+
+    async def parse(self, source: Source, filename: str) -> tuple[Union[str, list], bool, Optional[dict]]:
+        # Checked here rather than in the worker: HTTPException does not
+        # survive the trip back through pickle.
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            raise unsupported_file_error()
+
+        async with self._files:
+            try:
+                return await asyncio.wait_for(self._parse(source, filename), self.timeout)
+            except BrokenProcessPool:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Could not parse {filename}: the parser process crashed"
+                )
+            except asyncio.TimeoutError:
+                if self._pool is not None:
+                    self._recycle(self._pool)
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"Timed out parsing {filename} after {self.timeout:.0f}s"
+                )
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
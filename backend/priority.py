@@ -0,0 +1,166 @@
+import time
+import random
+import logging
+import threading
+from typing import List
+
+import numpy as np
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_COLLECTION = "priority_histogram"
+SCORE_RANGE = (0.0, 100.0)
+
+# Same split as the old per-upload ranking: top third High, middle Medium
+PRIORITY_BINS = np.array([1 / 3, 2 / 3])
+PRIORITY_LABELS = np.array(["Low", "Medium", "High"])
+
+
+class PriorityEngine:
+    """
+    Percentile-based priorities against every complaint scored so far.
+
+    The global risk-score distribution is a fixed-width histogram over
+    0-100, persisted as sharded Firestore counters (one Increment write per
+    scored batch) and mirrored in memory. A complaint's priority is read
+    off its percentile as soon as it is scored, so single-file uploads,
+    streaming chunks and background jobs all get final priorities that are
+    comparable with each other. The mirror is re-read from Firestore every
+    `refresh_interval` seconds so several workers converge on one
+    distribution; rerank_open() re-labels stored open complaints when the
+    distribution has moved.
+    """
+
+    def __init__(self, db, bins: int = 1000, shards: int = 10, refresh_interval: float = 60.0,
+                 collection: str = HISTOGRAM_COLLECTION):
+        self.db = db
+        self.bins = bins
+        self.shards = max(1, shards)
+        self.refresh_interval = refresh_interval
+        self.collection = collection
+        self._hist = np.zeros(bins, dtype=np.int64)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    # ---------- histogram ----------
+    def _bin_of(self, scores) -> np.ndarray:
+        lo, hi = SCORE_RANGE
+        idx = ((np.asarray(scores, dtype=np.float64) - lo) / (hi - lo) * self.bins).astype(np.int64)
+        return np.clip(idx, 0, self.bins - 1)
+
+    def _read_histogram(self) -> np.ndarray:
+        hist = np.zeros(self.bins, dtype=np.int64)
+        for snap in self.db.collection(self.collection).stream():
+            for b, n in ((snap.to_dict() or {}).get("bins") or {}).items():
+                if int(b) < self.bins:
+                    hist[int(b)] += n
+        return hist
+
+    def _refresh_if_stale(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        try:
+            hist = self._read_histogram()
+        except Exception as e:
+            logger.warning(f"Could not load score histogram: {e}")
+            hist = None
+        with self._lock:
+            # record() persists synchronously, so the stored histogram
+            # already holds this worker's increments
+            if hist is not None:
+                self._hist = hist
+            self._loaded_at = time.monotonic()
+
+    def record(self, scores: List[float]):
+        """Add scores to the distribution (memory now, Firestore in one write)"""
+        if not len(scores):
+            return
+        counts = np.bincount(self._bin_of(scores), minlength=self.bins)
+        with self._lock:
+            self._hist += counts
+        nonzero = np.flatnonzero(counts)
+        try:
+            shard = self.db.collection(self.collection).document(f"shard-{random.randrange(self.shards)}")
+            shard.set({"bins": {str(b): firestore.Increment(int(counts[b])) for b in nonzero}}, merge=True)
+        except Exception as e:
+            logger.warning(f"Could not persist score histogram: {e}")
+
+    def percentiles(self, scores: List[float]) -> np.ndarray:
+        """Share of recorded scores below each score (mid-bin), 0..1"""
+        self._refresh_if_stale()
+        with self._lock:
+            hist = self._hist.copy()
+        total = hist.sum()
+        if total == 0:
+            return np.full(len(scores), 0.5)
+        below = np.concatenate([[0], np.cumsum(hist)[:-1]])
+        idx = self._bin_of(scores)
+        return (below[idx] + 0.5 * hist[idx]) / total
+
+    def priorities(self, scores: List[float]) -> List[str]:
+        if not len(scores):
+            return []
+        return PRIORITY_LABELS[np.digitize(self.percentiles(scores), PRIORITY_BINS)].tolist()
+
+    def assign(self, results: list) -> list:
+        """Record a scored batch and set risk_analysis["priority"] on each result"""
+        scores = [r["risk_analysis"]["risk_score"] for r in results]
+        self.record(scores)
+        for r, p in zip(results, self.priorities(scores)):
+            r["risk_analysis"]["priority"] = p
+        return results
+
+    def stats(self) -> dict:
+        self._refresh_if_stale()
+        with self._lock:
+            hist = self._hist.copy()
+        total = int(hist.sum())
+        lo, hi = SCORE_RANGE
+        cuts = {}
+        if total:
+            cum = np.cumsum(hist) / total
+            for name, q in (("medium_from", PRIORITY_BINS[0]), ("high_from", PRIORITY_BINS[1])):
+                cuts[name] = round(lo + (hi - lo) * int(np.searchsorted(cum, q)) / self.bins, 2)
+        return {"scores_recorded": total, "bins": self.bins, **cuts}
+
+    # ---------- maintenance ----------
+    def rebuild(self, complaints_collection: str = "complaints"):
+        """Recompute the histogram from the stored risk scores"""
+        scores = [
+            (snap.to_dict() or {}).get("risk_score")
+            for snap in self.db.collection(complaints_collection).select(["risk_score"]).stream()
+        ]
+        counts = np.bincount(self._bin_of([s for s in scores if s is not None]), minlength=self.bins)
+
+        batch = self.db.batch()
+        col = self.db.collection(self.collection)
+        batch.set(col.document("shard-0"), {"bins": {str(b): int(counts[b]) for b in np.flatnonzero(counts)}})
+        for n in range(1, self.shards):
+            batch.set(col.document(f"shard-{n}"), {"bins": {}})
+        batch.commit()
+        with self._lock:
+            self._hist = counts.astype(np.int64)
+            self._loaded_at = time.monotonic()
+
+    def rerank_open(self, complaints_collection: str = "complaints", batch_size: int = 500) -> dict:
+        """Re-label open complaints against the current distribution"""
+        self._loaded_at = None  # always rank against the latest histogram
+        snaps = list(
+            self.db.collection(complaints_collection)
+            .where("status", "==", "open")
+            .select(["risk_score", "priority"])
+            .stream()
+        )
+        snaps = [(s.id, s.to_dict() or {}) for s in snaps]
+        snaps = [(doc_id, d) for doc_id, d in snaps if d.get("risk_score") is not None]
+        new = self.priorities([d["risk_score"] for _, d in snaps])
+        changed = [(doc_id, p) for (doc_id, d), p in zip(snaps, new) if d.get("priority") != p]
+
+        col = self.db.collection(complaints_collection)
+        for start in range(0, len(changed), batch_size):
+            batch = self.db.batch()
+            for doc_id, p in changed[start:start + batch_size]:
+                batch.update(col.document(doc_id), {"priority": p})
+            batch.commit()
+        return {"checked": len(snaps), "updated": len(changed)}
@@ -1,48 +1,84 @@
-import firebase_admin
-from firebase_admin import credentials,firestore
+from firebase_admin import firestore
 import uuid
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Union
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 import numpy as np
-import joblib
-import tempfile
 import os
-import re
-from datetime import datetime
-import xgboost as xgb
-from datetime import datetime
 from dotenv import load_dotenv
-from google.oauth2 import service_account
 import json
 
-import fitz  # PyMuPDF
-from docx import Document
-import spacy
-from sentence_transformers import SentenceTransformer
+import asyncio
+from collections import Counter
+from functools import lru_cache
 
-# OCR (PDF only)
-from pdf2image import convert_from_path
-import pytesseract
-import pandas as pd
+from firestore_writer import MAX_BATCH_WRITES, BulkComplaintWriter
+from models import (
+    ML_MODELS, RISK_MODEL_PATH, SCALER_PATH, preload_from_env, registry,
+)
+from jobs import JobPipeline, JobStore
+from complaint_queries import ComplaintLists
+from aggregates import ComplaintStats
+from priority import PriorityEngine
+from dedup import DuplicateIndex
+from cache import ContentCache, content_key, file_version
+from extraction import extract_body, extract_complaint, extract_fields, resolve_population
+from locations import LocationResolver
+from parsers import ParsePool, iter_structured_chunks
+from uploads import (
+    MULTIPART_SLACK_BYTES, UPLOAD_REQUEST_MAX_BYTES, UploadLimitMiddleware,
+    read_upload, read_uploads, upload_stats,
+)
 
 load_dotenv()
 
-json_str = os.getenv("FIREBASE_CREDS")
-cred_info = json.loads(json_str)
+# Connected on first use (see models.load_firestore)
+db = registry.proxy("firestore")
+
+parse_pool = ParsePool(
+    max_workers=int(os.getenv("PARSE_WORKERS", "0")) or None,
+    max_concurrent_files=int(os.getenv("PARSE_MAX_CONCURRENT_FILES", "4")),
+    timeout=float(os.getenv("PARSE_TIMEOUT", "120")),
+)
 
-if "private_key" in cred_info:
-    cred_info["private_key"] = cred_info["private_key"].replace("\\n", "\n")
+# Short-lived cache of /admin/complaints responses, dropped on every write
+complaint_lists = ComplaintLists(db, ttl=float(os.getenv("COMPLAINT_LIST_TTL", "15")))
 
-firebase_cred = credentials.Certificate(cred_info)
+# Sharded dashboard counters, updated on every insert / resolve
+complaint_stats = ComplaintStats(db, shards=int(os.getenv("STATS_SHARDS", "10")))
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(firebase_cred)
+# Percentile priorities against the global score distribution
+priority_engine = PriorityEngine(
+    db,
+    shards=int(os.getenv("STATS_SHARDS", "10")),
+    refresh_interval=float(os.getenv("PRIORITY_REFRESH_INTERVAL", "60")),
+)
+# Seconds between background re-rankings of open complaints (0 = off)
+PRIORITY_RERANK_INTERVAL = float(os.getenv("PRIORITY_RERANK_INTERVAL", "0"))
 
-db = firestore.client()
+complaint_writer = BulkComplaintWriter(
+    db,
+    batch_size=int(os.getenv("FIRESTORE_BATCH_SIZE", "500")),
+    max_retries=int(os.getenv("FIRESTORE_MAX_RETRIES", "3")),
+)
 
 app = FastAPI()
 
+# Bulk exports get their own, larger size limit than UPLOAD_MAX_BYTES
+STREAM_UPLOAD_MAX_BYTES = int(os.getenv("STREAM_UPLOAD_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# Refuses oversized upload requests before the multipart body is read.
+# Added first so CORS headers are still set on its 413s.
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/process-complaints": UPLOAD_REQUEST_MAX_BYTES,
+        "/jobs": UPLOAD_REQUEST_MAX_BYTES,
+        "/process-complaints/stream": STREAM_UPLOAD_MAX_BYTES and STREAM_UPLOAD_MAX_BYTES + MULTIPART_SLACK_BYTES,
+    },
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -51,17 +87,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-risk_model = xgb.XGBRegressor()
-risk_model.load_model("risk_model.json")
+async def rerank_periodically():
+    while True:
+        await asyncio.sleep(PRIORITY_RERANK_INTERVAL)
+        try:
+            await run_in_threadpool(rerank_open_complaints)
+        except Exception as e:
+            print(f"Priority re-rank failed: {e}")
 
-scaler = joblib.load("feature_scaler.pkl")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-nlp = spacy.load("en_core_web_sm")
+background_tasks = []
 
-def store_complaint_firebase(result: dict):
-    doc_id = str(uuid.uuid4())
+# Load the ML models in the background after startup so /ready turns
+# green without waiting for the first request (MODEL_WARMUP=0: fully lazy)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
 
-    data = {
+async def warm_up_models():
+    try:
+        await run_in_threadpool(registry.preload, list(ML_MODELS))
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+
+@app.on_event("startup")
+async def start_job_pipeline():
+    await job_pipeline.start()
+    if MODEL_WARMUP:
+        background_tasks.append(asyncio.create_task(warm_up_models()))
+    if PRIORITY_RERANK_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(rerank_periodically()))
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    for task in background_tasks:
+        task.cancel()
+    await job_pipeline.stop()
+    parse_pool.close()
+    complaint_writer.close()
+
+# Loaded on first use, or up front with PRELOAD_MODELS (see models.py)
+risk_scorer = registry.proxy("risk_scorer")
+embedder = registry.proxy("embedder")
+nlp = registry.proxy("nlp")
+preload_from_env()
+
+# Cached embeddings are keyed on the embedding model and backend; cached scores on the
+# regressor + scaler files as well, so retraining invalidates them. The backend
+# is the loaded embedder's (.version), not EMBEDDING_BACKEND: a missing ONNX
+# export falls back to torch, and torch vectors must not be cached as onnx.
+@lru_cache(maxsize=1)
+def score_model_version() -> str:
+    # Hashed on first scoring, so workers without the model files can still
+    # import this module and serve the Firestore-only endpoints
+    return embedder.version + ":" + file_version(RISK_MODEL_PATH, SCALER_PATH)
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_DB = os.getenv("CACHE_DB")  # e.g. "risk_cache.sqlite3" to keep entries across restarts
+CACHE_DB_MAX_ROWS = int(os.getenv("CACHE_DB_MAX_ROWS", "500000"))  # per cache table
+embedding_cache = ContentCache(
+    "embeddings", max_items=int(os.getenv("EMBEDDING_CACHE_ITEMS", "50000")),
+    ttl=CACHE_TTL, disk_path=CACHE_DB, max_disk_rows=CACHE_DB_MAX_ROWS,
+)
+score_cache = ContentCache(
+    "risk_scores", max_items=int(os.getenv("SCORE_CACHE_ITEMS", "100000")),
+    ttl=CACHE_TTL, disk_path=CACHE_DB, max_disk_rows=CACHE_DB_MAX_ROWS,
+)
+# Near-duplicate reports (same zone, cosine >= threshold) reuse the earlier
+# complaint's score and are linked to it instead of stored again. Opt-in:
+# with it on, a re-uploaded sheet is linked, not stored a second time.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "0") == "1"
+duplicate_index = DuplicateIndex(
+    threshold=float(os.getenv("DEDUP_THRESHOLD", "0.93")),
+    window=float(os.getenv("DEDUP_WINDOW_HOURS", "72")) * 3600,
+    max_per_zone=int(os.getenv("DEDUP_MAX_PER_ZONE", "5000")),
+) if DEDUP_ENABLED else None
+# Embeddings computed for the duplicate check and handed on to scoring
+embedding_reuse = {"reused_for_scoring": 0}
+
+location_resolver = LocationResolver(
+    nlp,
+    batch_size=int(os.getenv("SPACY_BATCH_SIZE", "64")),
+    n_process=int(os.getenv("SPACY_N_PROCESS", "1")),
+)
+
+def complaint_document(result: dict) -> dict:
+    return {
         "filename": result["filename"],
 
         **result["extracted"],
@@ -71,438 +179,550 @@ def store_complaint_firebase(result: dict):
         "created_at": firestore.SERVER_TIMESTAMP,
     }
 
-    db.collection("complaints").document(doc_id).set(data)
-
-def parse_pdf_text(path: str) -> str:
-    text = ""
-    with fitz.open(path) as pdf:
-        for page in pdf:
-            text += page.get_text()
-    return text.strip()
-
-def ocr_pdf(path: str) -> str:
-    try:
-        images = convert_from_path(path, dpi=300)
-        return " ".join(
-            pytesseract.image_to_string(img, lang="eng") for img in images
-        ).strip()
-    except Exception:
-        return ""
-
-def parse_docx(path: str) -> str:
-    doc = Document(path)
-    text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
-    del doc
-    return text.strip()
-
-def parse_structured(df: pd.DataFrame) -> List[dict]:
-    records = []
-    for _, row in df.iterrows():
-        records.append({
-            "subject": str(row.get("subject", "")).strip(),
-            "complaint": str(row.get("complaint", "")).strip(),
-            "location": str(row.get("location", "")).strip(),
-            "date": str(row.get("date", "")).strip(),
-            "sender": str(row.get("sender", "")).strip(),
-        })
-    return records
+# Optional JSONL feed of stored complaints for RAG retrieval. Index it with
+# `vector_create.py --incremental --source <feed>`: the feed is added to the
+# instruction dataset (and remembered for later incremental runs), it does
+# not replace it.
+COMPLAINT_FEED_PATH = os.getenv("COMPLAINT_FEED_PATH")
+
+def append_complaint_feed(results: list):
+    with open(COMPLAINT_FEED_PATH, "a", encoding="utf-8") as feed:
+        for r in results:
+            if r.get("stored"):
+                feed.write(json.dumps({
+                    "id": r["id"],
+                    "complaint": r["extracted"]["complaint"],
+                    "location": r["extracted"]["location"],
+                    "severity": r["risk_analysis"]["severity"],
+                }) + "\n")
+
+def store_complaints_firebase(results: list) -> list:
+    """Bulk-write results and tag each one with its document id and outcome"""
+    new = [r for r in results if not r.get("duplicate_of")]
+    documents = [complaint_document(r) for r in new]
+    statuses = complaint_writer.write(documents, ids=[r.get("id") for r in new])
+    for r, st in zip(new, statuses):
+        r["id"] = st["id"]
+        r["stored"] = st["stored"]
+        if st["error"]:
+            r["store_error"] = st["error"]
+    complaint_lists.invalidate()
+    if duplicate_index is not None:
+        duplicate_index.discard([r["id"] for r in new if not r["stored"]])
+
+    link_duplicates([r for r in results if r.get("duplicate_of")])
+    complaint_stats.record_new(d for d, st in zip(documents, statuses) if st["stored"])
+
+    if COMPLAINT_FEED_PATH:
+        append_complaint_feed(results)
+    return results
 
-def parse_file(path: str, filename: str) -> tuple[Union[str, list], bool]:
-    ext = os.path.splitext(filename)[1].lower()
+def link_duplicates(duplicates: list):
+    """Count repeat reports on the complaint they duplicate instead of storing them"""
+    if not duplicates:
+        return
+    counts = Counter(r["duplicate_of"] for r in duplicates)
+    col = db.collection("complaints")
+    linked = set()
+    heads = list(counts.items())
+    for start in range(0, len(heads), MAX_BATCH_WRITES):
+        chunk = heads[start:start + MAX_BATCH_WRITES]
+        batch = db.batch()
+        for head, n in chunk:
+            batch.update(col.document(head), {
+                "duplicate_count": firestore.Increment(n),
+                "last_reported_at": firestore.SERVER_TIMESTAMP,
+            })
+        try:
+            batch.commit()
+            linked.update(head for head, _ in chunk)
+        except Exception as e:
+            print(f"Failed to link {len(chunk)} duplicate clusters: {e}")
 
-    if ext == ".pdf":
-        text = parse_pdf_text(path)
-        if len(text) >= 50:
-            return text, False
-        return ocr_pdf(path), True
+    for r in duplicates:
+        r["id"] = r["duplicate_of"]
+        r["stored"] = False
+        r["linked"] = r["duplicate_of"] in linked
 
-    if ext == ".docx":
-        return parse_docx(path), False
+def extract_location(text: str) -> Optional[str]:
+    return location_resolver.resolve([text])[0]
 
-    if ext == ".csv":
-        df = pd.read_csv(path)
-        return parse_structured(df), False
 
-    if ext in [".xls", ".xlsx"]:
-        df = pd.read_excel(path)
-        return parse_structured(df), False
+# ---------------- ML ----------------
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
 
-    raise HTTPException(
-        status_code=422,
-        detail="Unsupported file type. Upload PDF, DOCX, CSV, XLS or XLSX only."
-    )
+SEVERITY_BINS = np.array([40, 65, 80])
+SEVERITY_LABELS = np.array(["Low", "Medium", "High", "Critical"])
 
-def clean_text(t: str) -> str:
-    return re.sub(r"\s+", " ", t).strip()
 
-def extract_subject(raw_text: str) -> Optional[str]:
-    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
+def severity_labels(risks: np.ndarray) -> np.ndarray:
+    # Same thresholds as before: <40 Low, <65 Medium, <80 High, else Critical
+    return SEVERITY_LABELS[np.digitize(risks, SEVERITY_BINS, right=False)]
 
-    # Case 1: Explicit "Subject" with or without colon
-    for l in lines[:5]:
-        m = re.match(r"(?i)^subject[\s:\-]+(.+)", l)
-        if m:
-            return m.group(1).strip()
 
-    # Case 2: First short line heuristic (gov style)
-    first = lines[0] if lines else ""
-    if 5 < len(first) < 120:
-        return first
+def embed_texts(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """MiniLM embeddings, encoding only texts missing from the cache"""
+    keys = [content_key(t, embedder.version) for t in texts]
+    cached = embedding_cache.get_many(keys)
+    missing = [i for i, e in enumerate(cached) if e is None]
 
-    return None
+    if missing:
+        fresh = embedder.encode(
+            [texts[i] for i in missing], batch_size=batch_size, convert_to_numpy=True
+        )
+        embedding_cache.set_many([(keys[i], e) for i, e in zip(missing, fresh)])
+        for i, e in zip(missing, fresh):
+            cached[i] = e
 
+    return np.vstack(cached)
 
-def extract_sender(raw_text: str) -> str:
-    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
 
-    # Case 1: Explicit Sender (with or without colon)
-    for l in reversed(lines):
-        m = re.match(r"(?i)^sender[\s:\-]+(.+)", l)
-        if m:
-            return m.group(1).strip()
+def predict_risk_batch(
+    complaints: List[str],
+    populations: List[int],
+    batch_size: int = EMBED_BATCH_SIZE,
+    embeddings: Optional[np.ndarray] = None,
+):
+    """
+    Score many complaints with one embedding pass and one XGBoost call.
+    Pass `embeddings` (one row per complaint) if they are already computed.
+    """
+    if not complaints:
+        return []
+
+    keys = [content_key(c, score_model_version(), p) for c, p in zip(complaints, populations)]
+    scores = score_cache.get_many(keys)
+    missing = [i for i, s in enumerate(scores) if s is None]
+    if not missing:
+        return scores
+
+    if embeddings is not None:
+        emb = embeddings[missing]
+        embedding_reuse["reused_for_scoring"] += len(missing)
+    else:
+        emb = embed_texts([complaints[i] for i in missing], batch_size=batch_size)
+    # Scaler applied in place, booster called directly (see risk_scorer.py)
+    risks = risk_scorer.score(emb, [populations[i] for i in missing])
+    sevs = severity_labels(risks)
 
-    # Case 2: Organization-style ending line
-    for l in reversed(lines[-5:]):
-        if any(k in l.lower() for k in [
-            "committee", "association", "residents",
-            "society", "citizens", "welfare"
-        ]):
-            return l
+    fresh = [(round(float(r), 2), str(s)) for r, s in zip(risks, sevs)]
+    score_cache.set_many([(keys[i], sc) for i, sc in zip(missing, fresh)])
+    for i, sc in zip(missing, fresh):
+        scores[i] = sc
 
-    return "Anonymous"
+    return scores
 
 
-def extract_date(text: str) -> str:
-    t = re.sub(r"\s+", " ", text)
+def predict_risk(complaint: str, population: int):
+    return predict_risk_batch([complaint], [population])[0]
 
-    patterns = [
-     
-        r"\b\d{1,2}\s*(January|February|March|April|May|June|July|August|September|October|November|December)\s*\d{4}\b",
+# ---------------- API ----------------
 
+@app.patch("/admin/complaints/{complaint_id}/resolve")
+async def resolve_complaint(complaint_id: str):
+    """Mark a complaint as resolved"""
+    try:
+        # Update the document in Firestore
+        ref = db.collection("complaints").document(complaint_id)
+        before = ref.get()
+        ref.update({
+            "status": "closed",
+            "resolved_at": firestore.SERVER_TIMESTAMP
+        })
+        complaint_lists.invalidate()
+        if before.exists:
+            complaint_stats.record_resolved(before.to_dict())
+        # A new report of the same problem must be stored as an open complaint
+        if duplicate_index is not None:
+            duplicate_index.discard([complaint_id])
 
-        r"\b\d{1,2}\s*(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\s*\d{4}\b",
+        return {
+            "success": True,
+            "message": f"Complaint {complaint_id} marked as resolved",
+            "id": complaint_id
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to resolve complaint: {str(e)}"
+        )
 
 
-        r"\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b",
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving (models may still be loading)"""
+    return {"status": "alive"}
 
 
-        r"\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b",
-    ]
+@app.get("/ready")
+def ready():
+    """Readiness: every ML model is loaded, so scoring will not stall"""
+    models = registry.status()
+    if not all(registry.is_loaded(name) for name in ML_MODELS):
+        raise HTTPException(status_code=503, detail={"ready": False, "models": models})
+    return {"ready": True, "models": models}
 
-    for p in patterns:
-        m = re.search(p, t, re.I)
-        if m:
-            raw = m.group(0)
-            for fmt in [
-                "%d %B %Y", "%d %b %Y",
-                "%d-%m-%Y", "%d/%m/%Y",
-                "%Y-%m-%d"
-            ]:
-                try:
-                    return datetime.strptime(raw, fmt).strftime("%Y-%m-%d")
-                except:
-                    pass
-            return raw 
-    return "Not mentioned"
 
+@app.get("/admin/stats")
+def get_stats():
+    """Complaint counts by status, severity, open severity, location and day"""
+    return complaint_stats.summary()
 
-def extract_location(text: str) -> Optional[str]:
-    t = re.sub(r"\s+", " ", text)
 
-    zone_patterns = [
-        r"\bzone\s*[-:]?\s*\d+\b",   # Zone 3, Zone-3
-        r"\bz\s*o\s*n\s*e\s*\d+\b",  # Z O N E 3 (OCR spaced)
-    ]
+@app.post("/admin/stats/rebuild")
+def rebuild_stats():
+    """Recount the stats from every stored complaint (one full read)"""
+    return complaint_stats.rebuild()
 
-    for p in zone_patterns:
-        m = re.search(p, t, re.I)
-        if m:
-            return m.group(0).replace(" ", "").title().replace("-", " ")
 
-    # 2️⃣ Named Entity Recognition
-    try:
-        doc = nlp(t)
-        for ent in doc.ents:
-            if ent.label_ == "GPE":
-                return ent.text
-    except:
-        pass
+def rerank_open_complaints(rebuild: bool = False) -> dict:
+    if rebuild:
+        priority_engine.rebuild()
+    outcome = priority_engine.rerank_open()
+    if outcome["updated"]:
+        complaint_lists.invalidate()
+    return outcome
 
-    return None
 
+@app.get("/admin/priorities")
+def priority_stats():
+    """Size of the score distribution and the current Medium / High cut-offs"""
+    return priority_engine.stats()
 
 
+@app.post("/admin/priorities/rerank")
+def rerank_priorities(rebuild: bool = False):
+    """
+    Re-label open complaints against the current score distribution.
+    ?rebuild=true first recomputes the distribution from stored scores.
+    """
+    return rerank_open_complaints(rebuild)
+
+
+@app.get("/admin/cache-stats")
+def cache_stats():
+    return {
+        "caches": [embedding_cache.stats(), score_cache.stats()],
+        "dedup": {
+            **(duplicate_index.stats() if duplicate_index is not None else {"enabled": False}),
+            **embedding_reuse,
+        },
+        "uploads": upload_stats,
+    }
 
 
-def extract_body(raw_text: str) -> str:
-    text = raw_text.replace("\r", "\n")
+@app.get("/admin/complaints")
+def get_all_complaints(
+    status: str = None,
+    severity: str = None,
+    priority: str = None,
+    location: str = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Get complaints, newest first, optionally filtered
+    Query params: ?status=open|closed &severity= &priority= &location=
+
+    Without `limit` every matching complaint is returned as a list. With
+    ?limit=N the response is one page, {"items": [...], "next_cursor": ...};
+    pass next_cursor back as ?cursor= for the following page. Pages carry
+    the list-view fields only (no complaint body) unless ?fields=a,b,c
+    names the fields to return.
+    """
+    filters = {"status": status, "severity": severity, "priority": priority, "location": location}
+    if limit is None and cursor is None:
+        return complaint_lists.all(filters)
+
+    return complaint_lists.page(
+        filters,
+        limit=limit or 50,
+        cursor=cursor,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+    )
 
-    # Split into lines
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    complaint_lines = []
 
-    for line in lines:
-        # ---------- HARD DROPS ----------
+def dedup_zone(location) -> Optional[str]:
+    """Partition for the duplicate check; None (no dedup) if the location is unknown"""
+    zone = str(location).strip() if location is not None else ""
+    if zone.lower() in ("", "nan", "none", "unknown"):
+        return None
+    return zone
 
-        # Drop subject line
-        if re.match(r"(?i)^subject\s*[:\-]", line):
-            continue
+def score_results(results: list, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Fill in risk_analysis for every pending result in one batched pass.
+    Near-duplicates of a recent complaint in the same zone copy its
+    analysis and get "duplicate_of" instead of being scored.
+    """
+    complaints = [r["extracted"]["complaint"] for r in results]
+    populations = [r["extracted"]["population_used"] for r in results]
 
-        # Drop To / From lines
-        if re.match(r"(?i)^(to|from)\s*[:\-]", line):
-            continue
+    if duplicate_index is None or not results:
+        scores = predict_risk_batch(complaints, populations, batch_size=batch_size)
+        for r, (risk, severity) in zip(results, scores):
+            r["risk_analysis"] = {
+                "risk_score": risk,
+                "severity": severity
+            }
+        # Final priorities right away, so they are stored with the complaint
+        return priority_engine.assign(results)
+
+    emb = embed_texts(complaints, batch_size=batch_size)
+    vecs = DuplicateIndex.normalize(emb)
+    zones = [dedup_zone(r["extracted"]["location"]) for r in results]
+    matches = duplicate_index.match(zones, vecs)
+
+    heads = [i for i, m in enumerate(matches) if m is None]
+    scores = predict_risk_batch(
+        [complaints[i] for i in heads],
+        [populations[i] for i in heads],
+        batch_size=batch_size,
+        embeddings=emb[heads],
+    )
+    for i, (risk, severity) in zip(heads, scores):
+        results[i]["risk_analysis"] = {
+            "risk_score": risk,
+            "severity": severity
+        }
+        # Known before the write so later duplicates can point at it
+        results[i]["id"] = str(uuid.uuid4())
+    priority_engine.assign([results[i] for i in heads])
+    duplicate_index.add(
+        [zones[i] for i in heads],
+        vecs[heads],
+        [results[i]["id"] for i in heads],
+        [results[i]["risk_analysis"] for i in heads],
+    )
 
-        # Drop metadata lines
-        if re.match(r"(?i)^(date|location|sender|address)\s*[:\-]", line):
+    for r, m in zip(results, matches):
+        if m is None:
             continue
+        if "batch_head" in m:
+            head = results[m["batch_head"]]
+            r["duplicate_of"] = head["id"]
+            r["risk_analysis"] = dict(head["risk_analysis"])
+        else:
+            r["duplicate_of"] = m["doc_id"]
+            r["risk_analysis"] = m["risk_analysis"]
+        r["similarity"] = m["similarity"]
+    return results
 
-        # Drop sign-offs
-        if re.search(
-            r"(?i)(yours sincerely|yours faithfully|with regards|thank you)",
-            line,
-        ):
-            break  # footer starts → stop reading
-
-        # Drop address / designation-heavy lines
-        # Heuristic: many commas + mostly title case
-        comma_count = line.count(",")
-        title_word_ratio = sum(w.istitle() for w in line.split()) / max(1, len(line.split()))
 
-        if comma_count >= 2 and title_word_ratio > 0.6:
-            continue
+def row_results(filename: str, rows: List[dict], pending_locations: list) -> list:
+    """
+    Build (unscored) results for spreadsheet rows. Rows without a location
+    are queued in pending_locations as (result, text) for bulk NER.
+    """
+    results = []
+    for row in rows:
+        body = extract_body(row["complaint"])
+        complaint = extract_complaint(body)
 
-        # Drop very short lines (headers, names)
-        if len(line) < 30:
+        if not complaint:
             continue
 
+        result = {
+            "filename": filename,
+            "extracted": {
+                "subject": row["subject"] or None,
+                "complaint": complaint,
+                "sender": row["sender"] or "Anonymous",
+                "date": row["date"] or "Not mentioned",
+                "location": row["location"] or None,
+                "population_used": resolve_population(body),
+                "ocr_used": False
+            }
+        }
+        if not result["extracted"]["location"]:
+            pending_locations.append((result, body))
 
-        # Must contain at least one verb-like word
-        if not re.search(r"\b(is|are|has|have|was|were|remain|causing|resulting)\b", line, re.I):
-            # still allow if long enough (OCR / formal phrasing)
-            if len(line) < 60:
-                continue
-
-        complaint_lines.append(line)
+        results.append(result)
+    return results
 
-    text = " ".join(complaint_lines)
-    return re.sub(r"\s+", " ", text).strip()
 
+def document_result(
+    filename: str, raw: str, ocr_used: bool, pending_locations: list, pages: Optional[dict] = None
+) -> Optional[dict]:
+    """(Unscored) result for a PDF/DOCX, or None if no complaint text was found"""
+    fields = extract_fields(raw)
+
+    if not fields["complaint"]:
+        return None
+
+    result = {
+        "filename": filename,
+        "extracted": {
+            "subject": fields["subject"],
+            "complaint": fields["complaint"],
+            "sender": fields["sender"],
+            "date": fields["date"],
+            "location": fields["zone"],
+            "population_used": fields["population"],
+            "ocr_used": ocr_used
+        }
+    }
+    if pages is not None:
+        # Per-page sources, timings and OCR failures (not stored)
+        result["pages"] = pages
+    if not fields["zone"]:
+        pending_locations.append((result, raw))
+    return result
 
 
+def failed_pages_note(pages: Optional[dict]) -> str:
+    failed = (pages or {}).get("failed_pages")
+    if not failed:
+        return ""
+    return f" (OCR failed on page {', '.join(str(p['page']) for p in failed)}: {failed[0]['error']})"
 
 
-def extract_complaint(body_text: str) -> str:
-    if len(body_text) < 50:
-        return ""
+@app.post("/process-complaints")
+async def process_complaints(files: List[UploadFile] = File(...)):
+    results = []
+    pending_locations = []
 
-    sentences = [
-        s.strip()
-        for s in re.split(r"[.!?]", body_text)
-        if len(s.strip()) > 20
-    ]
+    # In memory, or spilled to a temp file above UPLOAD_SPILL_BYTES (see uploads.py)
+    uploads = await read_uploads(files)
 
-    return ". ".join(sentences[:4])
+    # ---------- PARSE (all files concurrently, off the event loop) ----------
+    # return_exceptions so no parse is still reading a spilled file when we delete it
+    try:
+        parsed = await asyncio.gather(
+            *(parse_pool.parse(u.source, f.filename) for u, f in zip(uploads, files)),
+            return_exceptions=True,
+        )
+    finally:
+        for upload in uploads:
+            upload.close()
 
-PEOPLE_WORDS = [
-    "people", "residents", "citizens",
-    "individuals", "families", "households", "population"
-]
+    for outcome in parsed:
+        if isinstance(outcome, Exception):
+            raise outcome
 
-# ---------------- POPULATION LOGIC ----------------
-def resolve_population(text: str) -> int:
-    t = text.lower()
+    for f, (raw, ocr_used, pages) in zip(files, parsed):
+        # ---------- CSV / XLS ----------
+        if isinstance(raw, list):
+            results.extend(row_results(f.filename, raw, pending_locations))
+            continue  # move to next uploaded file
 
-    # 1️⃣ Explicit numeric population
-    m = re.search(
-        r"(affecting|affected|impacting)\s+(approximately\s+)?([\d,]+)\s+"
-        r"(people|residents|citizens|individuals|families|households)",
-        t
-    )
-    if m:
-        return int(m.group(3).replace(",", ""))
+        # ---------- PDF / DOCX ----------
+        result = document_result(f.filename, raw, ocr_used, pending_locations, pages)
+        if result is None:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Could not extract complaint text from {f.filename}" + failed_pages_note(pages)
+            )
+        results.append(result)
 
-    # 2️⃣ Very large impact
-    if re.search(r"(thousands of|large number of|numerous)\s+(" + "|".join(PEOPLE_WORDS) + r")", t):
-        return 10000
+    # ---------- LOCATIONS (one batched NER pass) ----------
+    await run_in_threadpool(location_resolver.fill, pending_locations)
 
-    # 3️⃣ Medium impact
-    if re.search(r"(many|several|multiple|large group of)\s+(" + "|".join(PEOPLE_WORDS) + r")", t):
-        return 3000
+    # ---------- SCORE (one batched pass for every file) ----------
+    await run_in_threadpool(score_results, results)
 
-    # 4️⃣ Small impact
-    if re.search(r"(few|some|limited number of|nearby)\s+(" + "|".join(PEOPLE_WORDS) + r")", t):
-        return 800
+    # ---------- PERSIST (batched, off the event loop) ----------
+    await run_in_threadpool(store_complaints_firebase, results)
 
-    # 5️⃣ No signal → local
-    return 500
+    return {"results": results}
 
 
-# ---------------- ML ----------------
-def predict_risk(complaint: str, population: int):
-    emb = embedder.encode([complaint])[0]
-    X = np.hstack([emb, [np.log1p(population)]]).reshape(1, -1)
-    risk = float(risk_model.predict(scaler.transform(X))[0])
-
-    if risk < 40:
-        sev = "Low"
-    elif risk < 65:
-        sev = "Medium"
-    elif risk < 80:
-        sev = "High"
+# ---------------- JOBS ----------------
+def extract_upload(filename: str, raw, ocr_used: bool, pages: Optional[dict] = None) -> list:
+    """Extract stage of the job pipeline: unscored results for one parsed file"""
+    pending_locations = []
+    if isinstance(raw, list):
+        results = row_results(filename, raw, pending_locations)
     else:
-        sev = "Critical"
+        result = document_result(filename, raw, ocr_used, pending_locations, pages)
+        if result is None:
+            raise ValueError(f"Could not extract complaint text from {filename}" + failed_pages_note(pages))
+        results = [result]
+    location_resolver.fill(pending_locations)
+    return results
 
-    return round(risk, 2), sev
 
-def assign_priority(results: list):
-    scores = sorted(
-        {r["risk_analysis"]["risk_score"] for r in results},
-        reverse=True
-    )
-    mapping = {}
-    for i, s in enumerate(scores):
-        ratio = i / max(1, len(scores) - 1)
-        if ratio <= 0.33:
-            mapping[s] = "High"
-        elif ratio <= 0.66:
-            mapping[s] = "Medium"
-        else:
-            mapping[s] = "Low"
+# JOB_DB: SQLite file shared by all uvicorn workers; in-process store if unset
+job_store = JobStore(os.getenv("JOB_DB", ":memory:"), ttl=float(os.getenv("JOB_TTL", "86400")))
+job_pipeline = JobPipeline(
+    job_store,
+    parse=parse_pool.parse,
+    extract=extract_upload,
+    score=score_results,
+    persist=store_complaints_firebase,
+    parse_workers=int(os.getenv("PARSE_MAX_CONCURRENT_FILES", "4")),
+    queue_size=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    batch_files=int(os.getenv("JOB_BATCH_FILES", "32")),
+)
 
-    for r in results:
-        r["risk_analysis"]["priority"] = mapping[r["risk_analysis"]["risk_score"]]
 
-    return results
+@app.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile] = File(...)):
+    """
+    Queue uploads for background processing and return a job id right away.
+    Poll GET /jobs/{job_id} for progress and results.
+    """
+    # Always spilled: queued jobs must not hold upload bytes in memory
+    uploads = await read_uploads(files, spill_bytes=0)
 
-# ---------------- API ----------------
-
-@app.patch("/admin/complaints/{complaint_id}/resolve")
-async def resolve_complaint(complaint_id: str):
-    """Mark a complaint as resolved"""
-    try:
-        # Update the document in Firestore
-        db.collection("complaints").document(complaint_id).update({
-            "status": "closed",
-            "resolved_at": firestore.SERVER_TIMESTAMP
-        })
-        
-        return {
-            "success": True,
-            "message": f"Complaint {complaint_id} marked as resolved",
-            "id": complaint_id
-        }
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to resolve complaint: {str(e)}"
-        )
+    job_id = await run_in_threadpool(job_store.create, [f.filename for f in files])
+    await job_pipeline.submit(job_id, [(f.filename, u) for f, u in zip(files, uploads)])
+    return {"job_id": job_id, "status": "queued", "files": len(uploads)}
 
 
-@app.get("/admin/complaints")
-def get_all_complaints(status: str = None):
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
     """
-    Get complaints, optionally filtered by status
-    Query params: ?status=open or ?status=closed
+    Job status, per-file state / errors, and the results processed so far
     """
-    query = db.collection("complaints")
-    
-    # Optional status filter
-    if status:
-        query = query.where("status", "==", status)
-    
-    docs = query.order_by("created_at", direction=firestore.Query.DESCENDING).stream()
-    
-    return [
-        {"id": doc.id, **doc.to_dict()}
-        for doc in docs
-    ]
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
 
 
-@app.post("/process-complaints")
-async def process_complaints(files: List[UploadFile] = File(...)):
-    results = []
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "1000"))
 
-    for f in files:
-        suffix = os.path.splitext(f.filename)[1]
+@app.post("/process-complaints/stream")
+async def process_complaints_stream(file: UploadFile = File(...)):
+    """
+    Chunked ingestion for large CSV/XLS/XLSX exports. Each chunk is parsed,
+    scored and stored before the next is read, and results are streamed
+    back as NDJSON (one result per line, then a summary line).
+    """
+    suffix = os.path.splitext(file.filename)[1].lower()
+    if suffix not in (".csv", ".xls", ".xlsx"):
+        raise HTTPException(
+            status_code=422,
+            detail="Streaming ingestion supports CSV, XLS and XLSX only."
+        )
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(await f.read())
-            path = tmp.name
+    # Small exports stay in memory; large ones spill to disk piecewise
+    upload = await read_upload(file, max_bytes=STREAM_UPLOAD_MAX_BYTES)
 
+    async def results_ndjson():
+        processed = stored = 0
+        chunks = iter_structured_chunks(upload.source, file.filename, STREAM_CHUNK_ROWS)
         try:
-            raw, ocr_used = parse_file(path, f.filename)
+            while True:
+                rows = await run_in_threadpool(next, chunks, None)
+                if rows is None:
+                    break
+
+                pending_locations = []
+                results = await run_in_threadpool(row_results, file.filename, rows, pending_locations)
+                await run_in_threadpool(location_resolver.fill, pending_locations)
+                await run_in_threadpool(score_results, results)
+                await run_in_threadpool(store_complaints_firebase, results)
+
+                processed += len(results)
+                stored += sum(r["stored"] for r in results)
+                yield "".join(json.dumps(r) + "\n" for r in results)
+
+            yield json.dumps({"done": True, "processed": processed, "stored": stored}) + "\n"
         finally:
-            try:
-                os.remove(path)
-            except PermissionError:
-                pass
-
-        # ---------- CSV / XLS ----------
-        if isinstance(raw, list):
-            for row in raw:
-                body = extract_body(row["complaint"])
-                complaint = extract_complaint(body)
-
-                if not complaint:
-                    continue
-
-                population = resolve_population(body)
-                risk, severity = predict_risk(complaint, population)
-
-                result = {
-                    "filename": f.filename,
-                    "extracted": {
-                        "subject": row["subject"] or None,
-                        "complaint": complaint,
-                        "sender": row["sender"] or "Anonymous",
-                        "date": row["date"] or "Not mentioned",
-                        "location": row["location"] or extract_location(body),
-                        "population_used": population,
-                        "ocr_used": False
-                    },
-                    "risk_analysis": {
-                        "risk_score": risk,
-                        "severity": severity
-                    }
-                }
-
-                results.append(result)
-                store_complaint_firebase(result)  # ✅ store EACH ROW
-
-            continue  # move to next uploaded file
-
-        # ---------- PDF / DOCX ----------
-        subject = extract_subject(raw)
-        body = extract_body(raw)
-        complaint = extract_complaint(body)
-
-        if not complaint:
-            raise HTTPException(
-                status_code=422,
-                detail=f"Could not extract complaint text from {f.filename}"
-            )
-
-        population = resolve_population(body)
-        risk, severity = predict_risk(complaint, population)
-
-        result = {
-            "filename": f.filename,
-            "extracted": {
-                "subject": subject,
-                "complaint": complaint,
-                "sender": extract_sender(raw),
-                "date": extract_date(raw),
-                "location": extract_location(raw),
-                "population_used": population,
-                "ocr_used": ocr_used
-            },
-            "risk_analysis": {
-                "risk_score": risk,
-                "severity": severity
-            }
-        }
-
-        results.append(result)
-        store_complaint_firebase(result)  # ✅ store ONE document
+            chunks.close()
+            upload.close()
 
-    return {"results": assign_priority(results)}
+    return StreamingResponse(results_ndjson(), media_type="application/x-ndjson")
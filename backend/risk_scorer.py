@@ -0,0 +1,63 @@
+"""
+Fast scoring path for the XGBoost risk regressor.
+
+XGBRegressor.predict(scaler.transform(X)) validates and converts its input
+on every call: sklearn checks and copies X into a new float64 array, and
+the wrapper builds the prediction config each time. RiskScorer applies the
+StandardScaler to the feature matrix in place (same float64 arithmetic, so
+scores are identical) and calls Booster.inplace_predict directly.
+
+Thread control is explicit: batches of up to SMALL_BATCH rows go to a
+single-threaded booster copy (one-row /chat-style calls pay no thread-pool
+wake-up), larger ones to a copy with `threads` threads (0 = all cores).
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+SMALL_BATCH = 64
+
+
+class RiskScorer:
+    def __init__(self, model_path: str, scaler_path: str, threads: int = 0, small_batch: int = SMALL_BATCH):
+        import joblib
+        import xgboost as xgb
+
+        self.small_batch = small_batch
+        self._single = xgb.Booster(params={"nthread": 1}, model_file=model_path)
+        self._multi = xgb.Booster(params={"nthread": threads or os.cpu_count() or 1}, model_file=model_path)
+
+        # Same trees the sklearn wrapper would use after early stopping
+        best = self._single.attr("best_iteration")
+        self.iteration_range = (0, int(best) + 1) if best is not None else (0, 0)
+
+        scaler = joblib.load(scaler_path)
+        self.n_features = int(scaler.n_features_in_)
+        self.mean = None if getattr(scaler, "mean_", None) is None else np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = None if getattr(scaler, "scale_", None) is None else np.asarray(scaler.scale_, dtype=np.float64)
+
+    def features(self, embeddings: np.ndarray, populations) -> np.ndarray:
+        """[embedding, log1p(population)] rows, standardized in place"""
+        n, dim = embeddings.shape
+        X = np.empty((n, dim + 1), dtype=np.float64)
+        X[:, :dim] = embeddings
+        X[:, dim] = np.log1p(np.asarray(populations, dtype=np.float64))
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def predict(self, X: np.ndarray, threads: Optional[int] = None) -> np.ndarray:
+        """Risk scores for already standardized features"""
+        if threads == 1 or (threads is None and len(X) <= self.small_batch):
+            booster = self._single
+        else:
+            booster = self._multi
+        # float32 is what XGBoost compares split thresholds in anyway
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return booster.inplace_predict(X, iteration_range=self.iteration_range, validate_features=False)
+
+    def score(self, embeddings: np.ndarray, populations) -> np.ndarray:
+        return self.predict(self.features(embeddings, populations)).astype(np.float64)
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from complaint_queries import ComplaintLists
+from firestore_writer import InMemoryFirestore
+
+
+def seeded_db(n: int = 25) -> InMemoryFirestore:
+    db = InMemoryFirestore()
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    col = db.collection("complaints")
+    for i in range(n):
+        # Pairs of equal timestamps, so the document id tie-break is exercised
+        col.document(f"c{i:03d}").set({
+            "subject": f"Complaint {i}",
+            "complaint": "Garbage has not been collected",
+            "status": "open" if i % 3 else "closed",
+            "location": "Pune" if i == 0 else "pune",
+            "created_at": start + timedelta(minutes=i // 2),
+        })
+    return db
+
+
+def newest_first(lists: ComplaintLists, filters: dict) -> list:
+    docs = sorted(lists.all(filters), key=lambda d: (d["created_at"], d["id"]), reverse=True)
+    return [d["id"] for d in docs]
+
+
+def page_through(lists: ComplaintLists, filters: dict, limit: int) -> list:
+    ids, cursor = [], None
+    while True:
+        page = lists.page(filters, limit=limit, cursor=cursor)
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_pages_cover_every_complaint_once_in_order():
+    lists = ComplaintLists(seeded_db(), ttl=0)
+    expected = newest_first(lists, {})
+    for limit in (1, 4, 7, 25, 100):
+        assert page_through(lists, {}, limit) == expected
+
+
+def test_pages_respect_filters_and_projection():
+    lists = ComplaintLists(seeded_db(), ttl=0)
+    expected = newest_first(lists, {"status": "open"})
+    assert page_through(lists, {"status": "open"}, 5) == expected
+
+    item = lists.page({}, limit=1)["items"][0]
+    assert "complaint" not in item and "subject" in item
+
+
+def test_cache_keys_are_case_sensitive():
+    lists = ComplaintLists(seeded_db())
+    assert len(lists.all({"location": "pune"})) == 24
+    assert len(lists.all({"location": "Pune"})) == 1
+    assert len(lists.page({"location": "Pune"}, limit=10)["items"]) == 1
@@ -0,0 +1,171 @@
+import io
+import os
+import logging
+import tempfile
+from typing import Dict, List, Union
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPILL_BYTES = int(os.getenv("UPLOAD_SPILL_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # 0 = no limit
+# Whole multipart body of one upload request (all its files), 0 = no limit
+UPLOAD_REQUEST_MAX_BYTES = int(os.getenv("UPLOAD_REQUEST_MAX_BYTES", str(200 * 1024 * 1024)))
+MULTIPART_SLACK_BYTES = 64 * 1024  # boundaries and part headers around a single file
+
+# Process-wide counters, shown under /admin/cache-stats
+upload_stats = {
+    "files": 0, "in_memory": 0, "spilled": 0, "bytes_spilled": 0,
+    "rejected": 0, "cleanup_failures": 0,
+}
+
+
+class BufferedUpload:
+    """
+    One uploaded file, held in memory until it grows past `spill_bytes`
+    and in a named temp file after that. `source` is what the parsers take:
+    the bytes, or the temp file path once spilled. A path rather than
+    SpooledTemporaryFile's anonymous file, because the parse pool's
+    processes have to be able to open it. Writing past `max_bytes` raises
+    413 straight away, so an oversized file is not copied to the end.
+
+    This copy comes after Starlette's: the multipart body is parsed into
+    its own SpooledTemporaryFile per file (on disk above 1 MB) before the
+    endpoint runs. Stopping an oversized request before it is read is
+    UploadLimitMiddleware's job.
+    """
+
+    def __init__(self, filename: str, spill_bytes: int = UPLOAD_SPILL_BYTES,
+                 max_bytes: int = UPLOAD_MAX_BYTES):
+        self.filename = filename
+        self.spill_bytes = spill_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.path = None
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._data = None
+
+    def reject(self):
+        upload_stats["rejected"] += 1
+        self.close()
+        raise HTTPException(status_code=413, detail=too_large(self.filename, self.max_bytes))
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.reject()
+
+        if self._file is None and self.size > self.spill_bytes:
+            self._file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(self.filename)[1])
+            self.path = self._file.name
+            self._file.write(self._buffer.getbuffer())
+            upload_stats["bytes_spilled"] += self._buffer.tell()
+            self._buffer = None
+
+        if self._file is not None:
+            self._file.write(chunk)
+            upload_stats["bytes_spilled"] += len(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def finish(self):
+        """Done writing: close the temp file (parsers reopen it) or freeze the bytes"""
+        upload_stats["files"] += 1
+        if self._file is not None:
+            self._file.close()
+            upload_stats["spilled"] += 1
+        else:
+            self._data = self._buffer.getvalue()
+            self._buffer = None
+            upload_stats["in_memory"] += 1
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        return self.path if self.spilled else self._data
+
+    def close(self):
+        self._buffer = self._data = None
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                upload_stats["cleanup_failures"] += 1
+                logger.warning(f"Could not remove spilled upload {self.path}: {e}")
+            self.path = None
+
+
+def too_large(filename: str, max_bytes: int) -> str:
+    return f"{filename} is larger than the {max_bytes / (1024 * 1024):g} MB upload limit"
+
+
+class UploadLimitMiddleware:
+    """
+    Caps the request body of the upload endpoints ({path: max bytes})
+    before the form is parsed. A Content-Length over the limit gets a 413
+    without the body being read; a body without one (chunked) is counted
+    as it arrives and cut off with a 413 once it passes the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if not limit:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            upload_stats["rejected"] += 1
+            response = JSONResponse({"detail": too_large("The upload", limit)}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    upload_stats["rejected"] += 1
+                    # Raised inside form parsing; FastAPI passes HTTPException through
+                    raise HTTPException(status_code=413, detail=too_large("The upload", limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(f: UploadFile, spill_bytes: int = UPLOAD_SPILL_BYTES,
+                      max_bytes: int = UPLOAD_MAX_BYTES) -> BufferedUpload:
+    upload = BufferedUpload(f.filename, spill_bytes, max_bytes)
+    if max_bytes and f.size is not None and f.size > max_bytes:
+        upload.reject()
+    while chunk := await f.read(UPLOAD_CHUNK_BYTES):
+        upload.write(chunk)
+    upload.finish()
+    return upload
+
+
+async def read_uploads(files: List[UploadFile], **kwargs) -> List[BufferedUpload]:
+    """read_upload for each file; if one fails, the ones already read are released"""
+    uploads = []
+    try:
+        for f in files:
+            uploads.append(await read_upload(f, **kwargs))
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+    return uploads